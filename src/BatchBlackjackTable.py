@@ -0,0 +1,233 @@
+import numpy as np
+
+from src.constants import *
+from src.Deck import CODE_VALUES
+from src.QTable import LEGAL_ACTION_MASKS, QTable
+from src.Rng import BatchedRng
+from src.StateEncoder import COMPOSITION_INDEX, BUST, StateEncoder
+
+HIT, STAY, SPLIT, DOUBLE = (ACTIONS.index(a) for a in ('hit', 'stay', 'split', 'double'))
+WIN, PUSH, LOSS = 1, 0, -1
+
+# COMPOSITION_INDEX.transitions as an array, so a whole column of hands can take a card at once
+TRANSITIONS = np.array(COMPOSITION_INDEX.transitions, dtype=np.int32)
+
+
+class ShoeArrays:
+    # one shoe of card values per table, each row shuffled and dealt independently
+    def __init__(self, num_tables: int, num_decks: int, penetration: float, rng: np.random.Generator) -> None:
+        self.rng = rng
+        self.cards = np.tile(np.tile(CODE_VALUES, num_decks), (num_tables, 1))
+        self.size = self.cards.shape[1]
+        self.cut_index = int(self.size * penetration)
+        self.pos = np.zeros(num_tables, dtype=np.int64)
+        self.shuffles = 0
+        self.shuffle(np.arange(num_tables))
+
+    def shuffle(self, rows: np.ndarray):
+        self.cards[rows] = self.rng.permuted(self.cards[rows], axis=1)
+        self.pos[rows] = 0
+        self.shuffles += len(rows)
+
+    # same cut card rule as Deck.needs_shuffle, checked between rounds
+    def shuffle_past_cut(self):
+        rows = np.flatnonzero(self.pos >= self.cut_index)
+        if len(rows):
+            self.shuffle(rows)
+
+    def draw(self, rows: np.ndarray) -> np.ndarray:
+        values = self.cards[rows, self.pos[rows]].astype(np.int32)
+        self.pos[rows] += 1
+        # like Deck.next, a shoe that runs out mid round is reshuffled and dealt from the top
+        empty = rows[self.pos[rows] == self.size]
+        if len(empty):
+            self.shuffle(empty)
+        return values
+
+
+class HandArrays:
+    # one hand per table, the same running totals Hand keeps
+    def __init__(self, num_tables: int) -> None:
+        self.hard_total = np.zeros(num_tables, dtype=np.int32)
+        self.has_ace = np.zeros(num_tables, dtype=bool)
+        self.num_cards = np.zeros(num_tables, dtype=np.int32)
+        self.first_value = np.zeros(num_tables, dtype=np.int32)
+        self.is_pair = np.zeros(num_tables, dtype=bool)
+        self.composition_id = np.zeros(num_tables, dtype=np.int32)
+
+    def clear(self):
+        self.hard_total[:] = 0
+        self.has_ace[:] = False
+        self.num_cards[:] = 0
+        self.first_value[:] = 0
+        self.is_pair[:] = False
+        self.composition_id[:] = 0
+
+    def add(self, rows: np.ndarray, values: np.ndarray):
+        composition_id = self.composition_id[rows]
+        live = composition_id != BUST
+        composition_id[live] = TRANSITIONS[composition_id[live], values[live]]
+        self.composition_id[rows] = composition_id
+
+        num_cards = self.num_cards[rows]
+        self.is_pair[rows] = (num_cards == 1) & (self.first_value[rows] == values)
+        self.first_value[rows] = np.where(num_cards == 0, values, self.first_value[rows])
+        self.hard_total[rows] += values
+        self.has_ace[rows] |= values == 1
+        self.num_cards[rows] = num_cards + 1
+
+    def totals(self, rows: np.ndarray):
+        hard_total = self.hard_total[rows]
+        is_soft = self.has_ace[rows] & (hard_total + 10 <= 21)
+        return hard_total + 10 * is_soft, is_soft
+
+    def is_blackjack(self, rows: np.ndarray) -> np.ndarray:
+        total, _ = self.totals(rows)
+        return (self.num_cards[rows] == 2) & (total == 21)
+
+
+class BatchBlackjackTable:
+    # runs num_tables independent BlackjackTables in lockstep on numpy arrays
+    # every seat plays from the same q table and follows the same rules as BlackjackTable:
+    # flat bet of 1, dealer peeks for blackjack on an ace or ten, hits soft 17, pushes on 22,
+    # a double draws one card and stands, a split is played as a stay
+    def __init__(self, num_tables: int, num_seats: int = 1, q_table: QTable = None, encoder: StateEncoder = None,
+                 num_decks: int = NUM_DECKS, penetration: float = DECK_PENETRATION, policy: str = 'weighted',
+                 learn: bool = False, initial_chip_count: int = 1000, seed=None, rng: BatchedRng = None) -> None:
+        assert policy in ('weighted', 'greedy')
+        self.num_tables = num_tables
+        self.num_seats = num_seats
+        self.encoder = encoder or StateEncoder()
+        self.q_table = q_table if q_table is not None else QTable(self.encoder.num_states)
+        # 'weighted' samples actions in proportion to the q weights like QDecisionEngine, 'greedy' takes the best one
+        self.policy = policy
+        # apply the same good/bad rewards QPlayer does at the end of every round
+        self.learn = learn
+
+        self.rng = rng or BatchedRng(seed)
+        self.shoe = ShoeArrays(num_tables, num_decks, penetration, self.rng.generator)
+        self.dealer = HandArrays(num_tables)
+        self.seats = [HandArrays(num_tables) for _ in range(num_seats)]
+        self.all_rows = np.arange(num_tables)
+
+        self.chips = np.full((num_tables, num_seats), initial_chip_count, dtype=np.int64)
+        self.score = {
+            'wins': np.zeros((num_tables, num_seats), dtype=np.int64),
+            'losses': np.zeros((num_tables, num_seats), dtype=np.int64),
+            'draws': np.zeros((num_tables, num_seats), dtype=np.int64)
+        }
+        self.hands_seen = 0
+
+    def get_metadata(self):
+        return {
+            'hands_seen': self.hands_seen,
+            'chips': int(self.chips.sum()),
+            'score': {k: int(v.sum()) for k, v in self.score.items()},
+            'engine': {'num_states': len(self.q_table)}
+        }
+
+    def state_ids(self, rows: np.ndarray, hand: HandArrays) -> np.ndarray:
+        return self.encoder.encode_many(self.dealer.first_value[rows], hand.composition_id[rows])
+
+    def stage_actions(self, states: np.ndarray, can_split: np.ndarray, can_double: np.ndarray) -> np.ndarray:
+        weights = self.q_table.values[states] * LEGAL_ACTION_MASKS[can_split | can_double << 1]
+        if self.policy == 'greedy':
+            return np.argmax(weights, axis=1)
+
+        # every weight was punished down to 0, fall back to a coin flip between hit and stay
+        cumulative = np.cumsum(weights, axis=1)
+        exhausted = cumulative[:, -1] <= 0
+        cumulative[exhausted] = [1, 2, 2, 2]
+        shot = self.rng.generator.random(len(states)) * cumulative[:, -1]
+        return np.sum(shot[:, None] >= cumulative, axis=1)
+
+    def deal(self):
+        self.shoe.shuffle_past_cut()
+        self.dealer.clear()
+        for hand in self.seats:
+            hand.clear()
+
+        # two for the dealer, then two for each seat
+        self.dealer.add(self.all_rows, self.shoe.draw(self.all_rows))
+        self.dealer.add(self.all_rows, self.shoe.draw(self.all_rows))
+        for hand in self.seats:
+            hand.add(self.all_rows, self.shoe.draw(self.all_rows))
+            hand.add(self.all_rows, self.shoe.draw(self.all_rows))
+
+        # flat bet of 1 for every seat
+        self.chips -= 1
+
+    # plays one seat on every table in rows, returns the (rows, states, actions) it staged
+    def process_player_preaction(self, hand: HandArrays, rows: np.ndarray):
+        staged = []
+        while len(rows):
+            # blackjacks and busts stay without asking the policy
+            total, _ = hand.totals(rows)
+            asking = (total <= 21) & ~((hand.num_cards[rows] == 2) & (total == 21))
+            rows = rows[asking]
+            if not len(rows):
+                break
+
+            states = self.state_ids(rows, hand)
+            actions = self.stage_actions(states, hand.is_pair[rows], hand.num_cards[rows] == 2)
+            staged.append((rows, states, actions))
+
+            drawing = rows[(actions == HIT) | (actions == DOUBLE)]
+            hand.add(drawing, self.shoe.draw(drawing))
+            rows = rows[actions == HIT]
+        return staged
+
+    def process_dealer_action(self, rows: np.ndarray):
+        while len(rows):
+            total, is_soft = self.dealer.totals(rows)
+            # dealer must hit on soft 17
+            hitting = (total <= 16) | ((total == 17) & is_soft)
+            rows = rows[hitting]
+            self.dealer.add(rows, self.shoe.draw(rows))
+
+    def process_player_result(self, hand: HandArrays, dealer_total: np.ndarray) -> np.ndarray:
+        player_total, _ = hand.totals(self.all_rows)
+        return np.where(player_total > 21, LOSS,
+               np.where(dealer_total == 22, PUSH,
+               np.where(dealer_total > 22, WIN, np.sign(player_total - dealer_total))))
+
+    def apply_rewards(self, staged, outcome: np.ndarray):
+        if not staged:
+            return
+        rows, states, actions = (np.concatenate(x) for x in zip(*staged))
+        np.add.at(self.q_table.visits, states, 1)
+        result = outcome[rows]
+        good, bad = result == WIN, result == LOSS
+        self.q_table.update(states[good], actions[good], GOOD_REWARD_VALUE)
+        self.q_table.update(states[bad], actions[bad], -BAD_REWARD_VALUE, floor=0)
+
+    ## main round robin function, one round on every table
+    def complete_a_round(self):
+        self.deal()
+
+        # dealer peeks on an ace or a ten, only a player blackjack pushes against it
+        upcard = self.dealer.first_value
+        dealer_blackjack = ((upcard == 1) | (upcard == 10)) & self.dealer.is_blackjack(self.all_rows)
+        playing = np.flatnonzero(~dealer_blackjack)
+
+        staged = [self.process_player_preaction(hand, playing) for hand in self.seats]
+        self.process_dealer_action(playing)
+        dealer_total, _ = self.dealer.totals(self.all_rows)
+
+        for seat, hand in enumerate(self.seats):
+            outcome = self.process_player_result(hand, dealer_total)
+            outcome = np.where(dealer_blackjack, np.where(hand.is_blackjack(self.all_rows), PUSH, LOSS), outcome)
+
+            # winners get their bet back twice, pushes get it back once
+            self.chips[:, seat] += 1 + outcome
+            self.score['wins'][:, seat] += outcome == WIN
+            self.score['losses'][:, seat] += outcome == LOSS
+            self.score['draws'][:, seat] += outcome == PUSH
+            if self.learn:
+                self.apply_rewards(staged[seat], outcome)
+
+        self.hands_seen += self.num_tables
+
+    def run(self, num_rounds: int):
+        for _ in range(num_rounds):
+            self.complete_a_round()
@@ -0,0 +1,63 @@
+import logging
+
+import numpy as np
+
+from src.constants import *
+from src.BatchBlackjackTable import BatchBlackjackTable
+from src.BlackjackTable import BlackjackTable
+from src.Card import Card
+from src.Deck import Deck
+from src.Player import BasePlayer, QPlayer
+
+logging.disable(logging.INFO)
+
+# QPlayer that keeps its q table fixed, so both tables follow the exact same policy
+class FrozenQPlayer(QPlayer):
+    last_action_good = BasePlayer.last_action_good
+    last_action_bad = BasePlayer.last_action_bad
+
+def set_basic_strategy(q_table, encoder):
+    # hit below 12 and on 12-16 against a 7 or better, double on 11, otherwise stay
+    for state in range(encoder.num_states):
+        dealer_value, descriptor = encoder.decode(state)
+        values = descriptor[1:]
+        hard_total = sum(values)
+        total = hard_total + 10 if 1 in values and hard_total + 10 <= 21 else hard_total
+        vector = [0, 1, 0, 0]
+        if total < 12 or (total < 17 and (dealer_value >= 7 or dealer_value == 1)):
+            vector = [1, 0, 0, 0]
+        if total == 11 and len(values) == 2:
+            vector = [0, 0, 0, 1]
+        q_table.values[state] = vector
+
+def test_matches_blackjack_table():
+    for seed in range(10):
+        batch = BatchBlackjackTable(1, 2, policy='greedy', seed=seed)
+        set_basic_strategy(batch.q_table, batch.encoder)
+
+        # deal the table the exact same shoe
+        deck = Deck()
+        deck.deck = [Card('spades', int(v)) for v in batch.shoe.cards[0]]
+        deck.is_shuffled = True
+        table = BlackjackTable(0, deck=deck)
+        for name in ('p1', 'p2'):
+            p = FrozenQPlayer(name, 1000)
+            set_basic_strategy(p.decision_engine.states, p.decision_engine.encoder)
+            table.add_player(p)
+
+        while not deck.needs_shuffle():
+            table.complete_a_round()
+            batch.complete_a_round()
+            assert deck.index == batch.shoe.pos[0]
+            for seat, p in enumerate(table.players):
+                assert p.chips == batch.chips[0, seat]
+                assert p.score == {k: v[0, seat] for k, v in batch.score.items()}
+
+def test_learning_updates_q_table():
+    batch = BatchBlackjackTable(1000, learn=True, seed=5)
+    batch.run(10)
+    metadata = batch.get_metadata()
+    assert metadata['hands_seen'] == 10000
+    assert sum(metadata['score'].values()) == 10000
+    assert metadata['engine']['num_states'] > 0
+    assert not np.all(batch.q_table.values == 1)
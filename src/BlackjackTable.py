@@ -1,21 +1,47 @@
 import logging
+from typing import List
 
 from src.constants import *
 from src.Deck import Deck
-from src.Player import Player
+from src.Player import BasePlayer, generate_dealer, generate_players
+from src.Rng import BatchedRng
+from src.ShoeTracker import ShoeTracker
+from src.TableStats import TableStats
 
 class Table:
-    def __init__(self):
-        self.deck = Deck()
+    def __init__(self, deck=None, rng: BatchedRng = None):
+        # every random draw at the table comes from this stream, seed it for reproducible runs
+        self.rng = rng or BatchedRng()
+        # any shoe with the Deck interface works here, e.g. an ArrayDeck
+        self.deck = deck if deck is not None else Deck(rng=self.rng.spawn(1)[0])
+        # every card the players have seen come out of the deck since its last shuffle
+        self.shoe = ShoeTracker(self.deck.len() // (len(SUITS) * len(VALUES)))
+        self.shoe_shuffles = self.deck.shuffles
+
+    # deal the next card, face up unless told otherwise; face down cards go to the shoe tracker once turned over
+    def draw(self, face_up: bool = True):
+        c = self.deck.next()
+        self.track_shuffle()
+        if face_up:
+            self.shoe.see(c.value)
+        return c
+
+    # the deck reshuffled, either between rounds or because it ran out mid round
+    def track_shuffle(self):
+        if self.deck.shuffles != self.shoe_shuffles:
+            self.shoe_shuffles = self.deck.shuffles
+            self.shoe.reset()
 
     def print_table_state(self):
         pass
 
 class BlackjackTable(Table):
-    def __init__(self, num_players: int = 0) -> None:
-        super().__init__()
-        self.dealer = Player.generate_dealer()
-        self.players = Player.generate_players(num_players)
+    def __init__(self, num_players: int = 0, deck=None, rng: BatchedRng = None) -> None:
+        super().__init__(deck, rng)
+        self.dealer = generate_dealer(rng=self.rng)
+        self.players = generate_players(num_players, rng=self.rng)
+        for p in self.players:
+            p.watch_shoe(self.shoe)
         self.rounds = []
         self.current_round = {}
 
@@ -24,6 +50,26 @@ class BlackjackTable(Table):
         # active_deal - bets locked in, players have been dealt
         self.round_status = TableRoundStates['INACTIVE_WAITING']
         self.logger = logging.getLogger(__name__)
+        # per phase timing and counters, off unless enable_stats is called
+        self.stats = None
+
+    # starts (or restarts) timing the round phases and counting cards, shuffles, new q states and saves
+    def enable_stats(self) -> TableStats:
+        if self.stats is None:
+            self.stats = TableStats(self)
+            self.stats.attach()
+        else:
+            self.stats.reset()
+        return self.stats
+
+    def disable_stats(self):
+        if self.stats is not None:
+            self.stats.detach()
+            self.stats = None
+
+    # totals since stats were enabled, None while they are off
+    def get_stats(self):
+        return self.stats.get_stats() if self.stats is not None else None
 
     def print_table_state(self):
         print(
@@ -38,62 +84,40 @@ class BlackjackTable(Table):
 
     # start a round
     def deal(self):
-        self.deck.reset()
-        self.deck.shuffle()
+        # the shoe is only reshuffled once the cut card has come out,
+        # otherwise play continues from where the last round stopped
+        # every opening card comes out in one draw, so the shoe is also reshuffled if they wouldn't all fit
+        k = 2 + 2 * len(self.players)
+        if self.deck.needs_shuffle() or self.deck.index + k >= self.deck.len():
+            self.deck.reset()
+        cards = self.deck.draw_cards(k)
+        self.track_shuffle()
+        # the cards are seen in the order they would be dealt one by one, so each bet only knows the cards before it
+        see = self.shoe.see
 
-        # two for the dealer
-        self.dealer.be_dealt(self.deck.next(), self.deck.next())
+        # two for the dealer, the second face down
+        see(cards[0].value)
+        self.dealer.be_dealt(cards[0], cards[1])
 
         # make your players bet
         # two for each player
-        for p in self.players:
-            p.set_bet()
-            p.be_dealt(self.deck.next(), self.deck.next())
+        for i, p in enumerate(self.players, 1):
+            p.stage_bet()
+            see(cards[2 * i].value)
+            see(cards[2 * i + 1].value)
+            p.be_dealt(cards[2 * i], cards[2 * i + 1])
 
-    def process_player_preaction(self, active_player: Player):
-        action = ACTIONS[active_player.pick_and_stage_q_action(self.dealer.get_showing_card())]
-        player_sum, _ = active_player.get_hand().sum()
-        self.logger.info(f"table: {active_player.get_name()}, ({player_sum}), chooses to {action}")
-
-        # loop
-        while action != 'stay':
-            # if action is hit
-            if action == 'hit':
-                active_player.hit(self.deck.next())
-                player_sum, _ = active_player.get_hand().sum()
-
-            # todo: if action is double
-            if action == 'double':
-                active_player.hit(self.deck.next())
-                player_sum, _ = active_player.get_hand().sum()
-                action = 'stay'
-                continue
-
-            # todo: if action is split, make temp second hand for player
-            if action == 'split':
-                # interpreting 'splitting' as staying for now, skip
-                action = 'stay'
-                continue
-
-            # if i bust, call it out and stop
-            if player_sum > 21:
-                # bust, call it bad
-                self.logger.info(f"{active_player.get_name()} {action} {player_sum} {active_player.get_hand()}")
-                # busted!
-                self.logger.info(f"{active_player.get_name()} 'BUST!'")
-                break
-
-        action = ACTIONS[active_player.pick_and_stage_q_action(self.dealer.get_showing_card())]
-        self.logger.info(f"{active_player.get_name()} {action} {player_sum} {active_player.get_hand()}")
-        return player_sum
+    def process_player_preaction(self, active_player: BasePlayer):
+        return process_preactions([(self, active_player)])[0]
 
     def process_dealer_action(self):
+        self.reveal_hole_card()
         dealer_sum, dealer_sum_is_hard = self.dealer.get_hand().sum()
         self.logger.info(f"{self.dealer.get_name()} {dealer_sum} {self.dealer.get_hand()}")
 
         # dealer must hit on soft 17, pushes on 22
         while (dealer_sum <= 16 and dealer_sum_is_hard) or (dealer_sum <= 17 and not dealer_sum_is_hard):
-            self.dealer.hit(self.deck.next())
+            self.dealer.hit(self.draw())
             dealer_sum, dealer_sum_is_hard = self.dealer.get_hand().sum()
             self.logger.info(f"{self.dealer.get_name()} {dealer_sum} {self.dealer.get_hand()}")
 
@@ -109,16 +133,20 @@ class BlackjackTable(Table):
 
         return dealer_sum
 
-    def process_player_result(self, dealer_sum, active_player: Player):
-        if dealer_sum >= 22:
+    def process_player_result(self, dealer_sum, active_player: BasePlayer):
+        player_sum, _ = active_player.get_hand().sum()
+        # a player bust loses even if the dealer busts afterwards
+        if player_sum > 21:
+            self.logger.info(f'{active_player.get_name()} busted')
+            active_player.last_action_bad()
+        elif dealer_sum == 22:
             active_player.last_action_neutral()
+        elif dealer_sum > 22:
+            self.logger.info(f'{active_player.get_name()} beats {self.dealer.get_name()}')
+            active_player.last_action_good()
         else:
-            player_sum, _ = active_player.get_hand().sum()
             # determine individual win or not
-            if player_sum > 21:
-                self.logger.info(f'{active_player.get_name()} busted')
-                active_player.last_action_bad()
-            elif dealer_sum > player_sum:
+            if dealer_sum > player_sum:
                 self.logger.info(f'{self.dealer.get_name()} beats {active_player.get_name()}')
                 active_player.last_action_bad()
             elif player_sum > dealer_sum:
@@ -137,6 +165,18 @@ class BlackjackTable(Table):
 
     ## main round robin function
     def complete_a_round(self):
+        if not self.start_round():
+            return
+
+        # get all actions from players
+        # then dealer does his action
+        # then resolve all players
+        for p in self.players:
+            self.process_player_preaction(p)
+        self.finish_round()
+
+    # deals and lets the dealer peek, false when a dealer blackjack already settled the round
+    def start_round(self) -> bool:
         # state machine
         # inactive_waiting - no round happening, receiving bets
         # active_deal - bets locked in, players have been dealt
@@ -148,32 +188,104 @@ class BlackjackTable(Table):
         if self.dealer.get_showing_card().value == 10:
             if self.dealer.get_hand().is_blackjack():
                 # everyone loses, game done
-                print('dealer got blackjack, all lose, restart')
-                self.round_status = TableRoundStates['INACTIVE_WAITING']
-                return
+                self.process_dealer_blackjack()
+                return False
         if self.dealer.get_showing_card().value == 1:
             # ask for insurance from players
             for p in self.players:
                 insurance = p.ask_for_insurance()
-            if self.dealer.get_hand().is_blackjack:
+            if self.dealer.get_hand().is_blackjack():
                 # everyone loses, game done
-                print('dealer got blackjack, all lose, restart')
-                self.round_status = TableRoundStates['INACTIVE_WAITING']
-                return
+                self.process_dealer_blackjack()
+                return False
+        return True
 
-        # get all actions from players
-        # then dealer does his action
-        # then resolve all players
-        for p in self.players:
-            self.process_player_preaction(p)
+    # the dealer plays out, then every player is paid
+    def finish_round(self):
         dealer_sum = self.process_dealer_action()
         for p in self.players:
             self.process_player_result(dealer_sum, p)
 
         self.round_status = TableRoundStates['INACTIVE_WAITING']
 
-    def add_player(self, new_player: Player):
+    def reveal_hole_card(self):
+        self.shoe.see(self.dealer.get_hand().get(1).value)
+
+    def process_dealer_blackjack(self):
+        self.reveal_hole_card()
+        self.logger.info('dealer got blackjack, all lose, restart')
+        # only a player blackjack pushes against the dealer's
+        for p in self.players:
+            if p.get_hand().is_blackjack():
+                p.last_action_neutral()
+            else:
+                p.last_action_bad()
+        self.round_status = TableRoundStates['INACTIVE_WAITING']
+
+    def add_player(self, new_player: BasePlayer):
         if self.round_status == TableRoundStates['INACTIVE_WAITING']:
             self.players.append(new_player)
+            new_player.watch_shoe(self.shoe)
         else:
             print('unable to add player ', new_player, ', gameplay has started')
+
+
+# plays the hands of seats [(table, player)] to the end together and returns each player's final sum
+# every pass asks each hand still in play for its next action, with one stage_actions call per decision engine,
+# then deals the cards those actions draw in seat order; hands only share a pass when the caller puts them together
+def process_preactions(seats) -> List[int]:
+    # blackjacks stay without asking
+    pending = [i for i, (_, p) in enumerate(seats) if not p.get_hand().is_blackjack()]
+    while pending:
+        actions = {}
+        by_engine = {}
+        for i in pending:
+            by_engine.setdefault(id(seats[i][1].decision_engine), []).append(i)
+        for rows in by_engine.values():
+            hands = [seats[i][1].get_hand() for i in rows]
+            staged = seats[rows[0]][1].decision_engine.stage_actions(
+                [seats[i][0].dealer.get_showing_card().value for i in rows],
+                [h.composition_id for h in hands],
+                [h.can_split() | h.can_double() << 1 for h in hands])
+            actions.update(zip(rows, staged.tolist()))
+
+        pending = [i for i in pending if apply_preaction(seats[i][0], seats[i][1], actions[i])]
+    return [p.get_hand().sum()[0] for _, p in seats]
+
+
+# deals whatever the action draws to the player's hand, true while the hand is still taking actions
+def apply_preaction(table: Table, p: BasePlayer, action_index: int) -> bool:
+    action = ACTIONS[action_index]
+    table.logger.info(f"table: {p.get_name()}, ({p.get_hand().sum()[0]}), chooses to {action}")
+    # todo: if action is split, make temp second hand for player
+    # interpreting 'splitting' as staying for now
+    if action == 'hit' or action == 'double':
+        p.hit(table.draw())
+        player_sum, _ = p.get_hand().sum()
+        if player_sum > 21:
+            # busted!
+            table.logger.info(f"{p.get_name()} {action} {player_sum} {p.get_hand()} 'BUST!'")
+            return False
+        return action == 'hit'
+    return False
+
+
+class TableGroup:
+    # plays a round on many BlackjackTables in lockstep, so a seat's decisions across every table
+    # reach its decision engine in one stage_actions call; each table still plays its seats in order
+    # off its own shoe, so every table deals exactly the cards it would on its own
+    # only players that share a decision engine share calls; the engine's per-round memory is shared with it,
+    # so share engines between players that don't learn from the table (optimal, frozen, evaluation)
+    # a table with stats on plays its round on its own, so its phases are timed for it alone
+    def __init__(self, tables: List[BlackjackTable]) -> None:
+        self.tables = tables
+
+    def complete_a_round(self):
+        for t in self.tables:
+            if t.stats is not None:
+                t.complete_a_round()
+        playing = [t for t in self.tables if t.stats is None and t.start_round()]
+        for seat in range(max((len(t.players) for t in playing), default=0)):
+            process_preactions([(t, t.players[seat]) for t in playing if seat < len(t.players)])
+        for t in playing:
+            t.finish_round()
@@ -1,20 +1,24 @@
+import copy
 import json
 import logging
-import matplotlib.pyplot as plt
+import tempfile
+
 import numpy as np
 
 
 from src.constants import *
 from src.Deck import Deck
-from src.Player import Player
-from src.BlackjackTable import BlackjackTable
+from src.Player import OptimalPlayer, QPlayer
+from src.BlackjackTable import BlackjackTable, TableGroup
+from src.Rng import BatchedRng
+from src.TrainingMetrics import TrainingMetrics
 
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 
 def test_table_population():
     t = BlackjackTable()
-    p1 = Player('p1', 1000)
-    p2 = Player('p2', 1000)
+    p1 = QPlayer('p1', 1000)
+    p2 = QPlayer('p2', 1000)
     t.add_player(p1)
     t.add_player(p2)
 
@@ -33,62 +37,55 @@ def test_parameterized_round():
     pass
 
 
-def test_iterate_table_and_graph():
-    table = BlackjackTable()
-    p1 = Player('test_danny', 1000)
-    p2 = Player('test_honi', 1000)
-    p1.load_states_from_file()
-    table.add_player(p1)
-    table.add_player(p2)
-
-    chips, wins, losses, win_rate, q_state_size = [], [], [], [], []
-    starting_index = p1.get_metadata()['hands_seen']
-    for i in range(1, NUM_TRAINING_ITERATIONS):
-        table.complete_a_round()
+def test_shoe_penetration():
+    t = BlackjackTable(2, deck=Deck(penetration=0.5))
+    t.complete_a_round()
+    index = t.deck.index
+    assert index > 0
 
-        metadata = p1.get_metadata()
+    # no reshuffle until the cut card comes out
+    t.complete_a_round()
+    assert t.deck.index > index
 
-        # populate tables
-        chips.append(metadata['chips'])
-        wins.append(metadata['score']['wins'])
-        losses.append(metadata['score']['losses'])
-        win_rate.append(float(metadata['score']['wins']) / float(starting_index + i))
-        q_state_size.append(metadata['num_states'])
+    while not t.deck.needs_shuffle():
+        t.complete_a_round()
+    t.complete_a_round()
+    assert t.deck.index < t.deck.cut_index
 
-        # print(wins, losses, q_state_size, metadata)
 
-    p1.save_states()
-    # standardize this and move to the top later
-    # import matplotlib.pyplot as plt
-    # import numpy as np
+# graphing driver, not collected as a test; headless training lives in blackjack_qlearning.py
+def iterate_table_and_graph():
+    import matplotlib.pyplot as plt
 
-    # Some example data to display
-    x = np.array(range(starting_index, starting_index + len(wins)))
-    y_chips = np.array(chips)
-    y_wins = np.array(wins)
-    y_losses = np.array(losses)
-    y_rate = np.array(win_rate)
-    y_size = np.array(q_state_size)
+    table = BlackjackTable()
+    p1 = QPlayer('test_danny', 1000)
+    p2 = QPlayer('test_honi', 1000)
+    p1.load_from_file()
+    table.add_player(p1)
+    table.add_player(p2)
 
-    # x = np.linspace(0, 2 * np.pi, 400)
-    # y = np.sin(x ** 2)
+    # fixed memory however many rounds, and the csv can be tailed while it runs
+    metrics = TrainingMetrics(p1, f'{PLAYER_FILE_PREFIX}/{p1.get_name()}.metrics.csv',
+                              flush_interval=max(1, NUM_TRAINING_ITERATIONS // 100))
+    for _ in range(1, NUM_TRAINING_ITERATIONS):
+        table.complete_a_round()
+        metrics.observe()
 
-    # print(x)
-    # print(y_wins)
-    # print(y_losses)
-    # print(y_size)
+    p1.save_to_file()
+    series = metrics.series()
+    x = series['hands']
 
     # turn to INFO as matplotlib has a lot of debug calls
     logging.basicConfig(level=logging.INFO)
 
     fig, axs = plt.subplots(4)
     fig.suptitle('wins v losses, win ratio, unique q states, player chip count')
-    axs[0].plot(x, y_wins)
-    axs[0].plot(x, y_losses)
-    # axs[1].plot(x, y_losses)
-    axs[1].plot(x, y_rate)
-    axs[2].plot(x, y_size)
-    axs[3].plot(x, y_chips)
+    axs[0].plot(x, series['wins'])
+    axs[0].plot(x, series['losses'])
+    axs[1].plot(x, series['win_rate'])
+    axs[1].plot(x, series['window_win_rate'])
+    axs[2].plot(x, series['q_states'])
+    axs[3].plot(x, series['chips'])
     plt.show()
 
 
@@ -109,6 +106,106 @@ def test_generate_all_q_states():
     return (list(unique_states))
 
 
+def test_seeded_tables_repeat():
+    runs = []
+    for _ in range(2):
+        t = BlackjackTable(2, rng=BatchedRng(7))
+        for _ in range(200):
+            t.complete_a_round()
+        runs.append([(p.name, p.chips, dict(p.score), p.decision_engine.states.values.copy()) for p in t.players])
+
+    for (name, chips, score, values), (name2, chips2, score2, values2) in zip(*runs):
+        assert (name, chips, score) == (name2, chips2, score2)
+        assert np.array_equal(values, values2)
+
+
+def test_table_stats():
+    t = BlackjackTable(2, rng=BatchedRng(3))
+    assert t.get_stats() is None
+    stats = t.enable_stats()
+    for _ in range(300):
+        t.complete_a_round()
+    t.players[1].saves += 1
+
+    totals = t.get_stats()
+    assert totals['rounds'] == 300
+    assert totals['calls']['deal'] == 300
+    assert totals['calls']['preaction'] + totals['calls']['result'] >= 300
+    assert all(seconds >= 0 for seconds in totals['seconds'].values())
+    assert totals['seconds']['round'] >= totals['seconds']['deal']
+    # at least two cards for the dealer and two for each player every round
+    assert totals['counters']['cards_drawn'] >= 300 * 6
+    assert totals['counters']['shuffles'] >= 1
+    assert totals['counters']['q_states_created'] > 0
+    assert totals['counters']['saves'] == 1
+
+    # disabled tables are back to the plain methods
+    t.disable_stats()
+    assert 'deal' not in t.__dict__ and t.get_stats() is None
+    t.complete_a_round()
+    assert stats.calls['deal'] == 300
+
+
+def test_shoe_tracker():
+    t = BlackjackTable(2, rng=BatchedRng(11))
+    for _ in range(200):
+        t.complete_a_round()
+        # every card dealt since the last shuffle has been turned over by the end of a round
+        assert t.shoe.cards_seen == t.deck.index
+        assert sum(t.shoe.full_counts) - sum(t.shoe.counts) == t.deck.index
+    assert all(p.shoe is t.shoe and p.decision_engine.shoe is t.shoe for p in t.players)
+
+    # with a bet spread the bet follows the true count
+    p = t.players[0]
+    p.bet_spread = 4
+    t.shoe.reset()
+    assert p.get_bet_value() == 1
+    t.shoe.running_count = 3.5 * t.shoe.decks_remaining()
+    assert p.get_bet_value() == 3
+    t.shoe.running_count = 100
+    assert p.get_bet_value() == 4
+
+
+def test_table_group():
+    # every seat copies one solved player and shares its engine, so the strategy is solved once
+    with tempfile.TemporaryDirectory() as tmp:
+        template = OptimalPlayer('shared', 1000, file_prefix=tmp)
+    engine = template.decision_engine
+    calls = []
+    stage_actions = engine.stage_actions
+    engine.stage_actions = lambda *rows: calls.append(len(rows[0])) or stage_actions(*rows)
+
+    def seat(table, name):
+        p = copy.deepcopy(template)
+        p.name = name
+        p.decision_engine = engine
+        table.add_player(p)
+
+    grouped = [BlackjackTable(0, rng=BatchedRng(seed)) for seed in range(4)]
+    alone = [BlackjackTable(0, rng=BatchedRng(seed)) for seed in range(4)]
+    for t in grouped + alone:
+        seat(t, 'a')
+        seat(t, 'b')
+
+    group = TableGroup(grouped)
+    # a table with stats on still plays every round, and its preactions are timed
+    stats = grouped[1].enable_stats()
+    for _ in range(50):
+        group.complete_a_round()
+    assert stats.calls['round'] == 50
+    assert stats.calls['preaction'] > 0
+    grouped_calls = len(calls)
+    for t in alone:
+        for _ in range(50):
+            t.complete_a_round()
+
+    # lockstep tables deal the same cards and pay the same as tables played on their own
+    for g, a in zip(grouped, alone):
+        assert [(p.chips, p.score) for p in g.players] == [(p.chips, p.score) for p in a.players]
+    assert grouped_calls < len(calls) - grouped_calls
+    assert max(calls) > 1
+
+
 if __name__ == '__main__':
     # test_table_setup()
-    test_iterate_table_and_graph() # main driver
+    iterate_table_and_graph() # main driver
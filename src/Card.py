@@ -1,12 +1,46 @@
 from src.constants import *
 
 class Card:
-    def __init__(self, suit: str, value: int) -> None:
-        assert (suit in SUITS)
-        assert (value in VALUES)
-        self.suit = suit
-        self.value = value
+    # immutable flyweight, one interned instance per (suit, rank) shared by every deck, hand and table
+    # rank is the index into VALUES, so 10/J/Q/K stay four different cards all worth 10;
+    # Card(suit, value) without a rank is the ten of that value
+    # code = suit index * len(VALUES) + rank, the same code Deck.CODE_CARDS is indexed by
+    # equality and hashing stay on identity, which interning makes exact and which costs nothing to compute
+    __slots__ = ('suit', 'value', 'rank', 'code', 'string')
+    _interned = {}
+
+    def __new__(cls, suit: str, value: int, rank: int = None):
+        if rank is None:
+            rank = VALUES.index(value)
+        card = cls._interned.get((suit, rank))
+        if card is None:
+            assert (suit in SUITS)
+            assert (VALUES[rank] == value)
+            card = object.__new__(cls)
+            object.__setattr__(card, 'suit', suit)
+            object.__setattr__(card, 'value', value)
+            object.__setattr__(card, 'rank', rank)
+            object.__setattr__(card, 'code', SUITS.index(suit) * len(VALUES) + rank)
+            object.__setattr__(card, 'string', f'{value}' + (SUIT_EMOJIS[suit] if INCLUDE_SUIT_IN_CARD_VALUE else ''))
+            cls._interned[(suit, rank)] = card
+        return card
+
+    def __setattr__(self, name, value):
+        raise AttributeError('cards are immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('cards are immutable')
+
+    # copies and pickles come back as the interned card
+    def __reduce__(self):
+        return Card, (self.suit, self.value, self.rank)
 
     def __str__(self) -> str:
-        # return f'{self.value} of {self.suit}'
-        return f'{self.value}' + (SUIT_EMOJIS[self.suit] if INCLUDE_SUIT_IN_CARD_VALUE else '')
\ No newline at end of file
+        return self.string
+
+    def __repr__(self) -> str:
+        return f'Card({self.suit!r}, {self.value}, {self.rank})'
+
+
+# all 52 cards in card code order
+CARDS = [Card(s, v, rank) for s in SUITS for rank, v in enumerate(VALUES)]
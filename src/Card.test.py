@@ -0,0 +1,27 @@
+import copy
+import pickle
+
+import pytest
+
+from src.constants import *
+from src.Card import CARDS, Card
+from src.Deck import Deck
+
+def test_interned():
+    assert len(CARDS) == len(SUITS) * len(VALUES) == len(set(map(id, CARDS)))
+    assert Card('hearts', 7) is Card('hearts', 7) is CARDS[Card('hearts', 7).code]
+    # tens and face cards are all worth 10 but stay different cards
+    assert Card('hearts', 10) is not Card('hearts', 10, rank=12)
+    assert copy.deepcopy(Card('clubs', 1)) is Card('clubs', 1)
+    assert pickle.loads(pickle.dumps(Card('clubs', 1))) is Card('clubs', 1)
+
+    # every deck in a shoe hands out the same 52 cards
+    assert set(map(id, Deck(6).deck)) == set(map(id, CARDS))
+
+def test_immutable():
+    c = Card('spades', 9)
+    assert str(c) == '9'
+    with pytest.raises(AttributeError):
+        c.value = 10
+    with pytest.raises(AttributeError):
+        c.anything = 1
@@ -0,0 +1,108 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from src.constants import *
+
+# where the dealer's hand can end up: standing on 17-21, 22 (pushes every player still in), bust, or blackjack
+DEALER_OUTCOMES = ['17', '18', '19', '20', '21', '22', 'bust', 'blackjack']
+OUTCOME_22, OUTCOME_BUST, OUTCOME_BLACKJACK = 5, 6, 7
+
+
+class DealerOutcomes:
+    # exact distribution of the dealer's final hand for an upcard and the cards still in the shoe,
+    # played by the table's rules (hits soft 17, pushes on 22) and drawn without replacement
+    # counts[v] is how many cards of value v (1-10) are left; the caller removes every card it has seen,
+    # the upcard included, as it leaves the shoe
+    # distributions are memoized on (upcard, composition key), the key is the counts packed into one int
+    # and moves with every remove/add, so a shoe that comes back to a composition reuses its results
+    def __init__(self, num_decks: int = NUM_DECKS, cache_size: int = DEALER_OUTCOME_CACHE_SIZE) -> None:
+        self.full_counts = [0] * 11
+        for v in VALUES:
+            self.full_counts[v] += num_decks * len(SUITS)
+        self.bits = max(self.full_counts).bit_length()
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.reset()
+
+    def reset(self):
+        self.counts = list(self.full_counts)
+        self.remaining = sum(self.counts)
+        self.key = self.pack(self.counts)
+
+    def pack(self, counts) -> int:
+        key = 0
+        for v in range(10, 0, -1):
+            key = (key << self.bits) | counts[v]
+        return key
+
+    def remove(self, value: int):
+        assert self.counts[value] > 0
+        self.counts[value] -= 1
+        self.remaining -= 1
+        self.key -= 1 << (self.bits * (value - 1))
+
+    def add(self, value: int):
+        self.counts[value] += 1
+        self.remaining += 1
+        self.key += 1 << (self.bits * (value - 1))
+
+    # probability of each DEALER_OUTCOMES entry for this upcard and the current shoe
+    # no_blackjack conditions on the dealer having peeked and found no blackjack, as the players only act then
+    def distribution(self, upcard: int, no_blackjack: bool = False) -> np.ndarray:
+        cache_key = (upcard, self.key)
+        outcomes = self.cache.get(cache_key)
+        if outcomes is None:
+            outcomes = self._play(upcard, 1 if upcard == 1 else 0, 1, {})
+            self.cache[cache_key] = outcomes
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(cache_key)
+
+        if no_blackjack and outcomes[OUTCOME_BLACKJACK] > 0:
+            outcomes = outcomes.copy()
+            outcomes[OUTCOME_BLACKJACK] = 0
+            outcomes /= outcomes.sum()
+        return outcomes
+
+    # expected return on a bet of 1 for a player standing on player_total, by the table's settlement rules
+    # a dealer blackjack is only reached by players that didn't have one, so it always loses
+    def stand_value(self, upcard: int, player_total: int, no_blackjack: bool = False) -> float:
+        if player_total > 21:
+            return -1.0
+        outcomes = self.distribution(upcard, no_blackjack)
+        dealer_totals = np.arange(17, 22)
+        win = outcomes[OUTCOME_BUST] + outcomes[:5][player_total > dealer_totals].sum()
+        lose = outcomes[OUTCOME_BLACKJACK] + outcomes[:5][player_total < dealer_totals].sum()
+        return float(win - lose)
+
+    # depth-first over every card the dealer can draw, memo holds the sub-results of this one call
+    # keyed by the hand so far and the shoe it was drawn from
+    def _play(self, hard_total: int, num_aces: int, num_cards: int, memo: dict) -> np.ndarray:
+        total = hard_total + 10 if num_aces and hard_total + 10 <= 21 else hard_total
+        outcomes = np.zeros(len(DEALER_OUTCOMES))
+        if num_cards == 2 and total == 21:
+            outcomes[OUTCOME_BLACKJACK] = 1
+            return outcomes
+        is_soft = total != hard_total
+        # dealer must hit on soft 17
+        if num_cards >= 2 and not (total <= 16 or (total == 17 and is_soft)):
+            outcomes[total - 17 if total <= 22 else OUTCOME_BUST] = 1
+            return outcomes
+
+        memo_key = (hard_total, num_aces > 0, min(num_cards, 2), self.key)
+        cached = memo.get(memo_key)
+        if cached is not None:
+            return cached
+
+        remaining = self.remaining
+        for v in range(1, 11):
+            count = self.counts[v]
+            if count == 0:
+                continue
+            self.remove(v)
+            outcomes += count / remaining * self._play(hard_total + v, num_aces + (v == 1), num_cards + 1, memo)
+            self.add(v)
+        memo[memo_key] = outcomes
+        return outcomes
@@ -0,0 +1,54 @@
+import numpy as np
+
+from src.Card import Card
+from src.DealerOutcomes import DEALER_OUTCOMES, OUTCOME_BLACKJACK, OUTCOME_BUST, DealerOutcomes
+from src.Deck import Deck
+from src.Hand import Hand
+from src.Rng import BatchedRng
+
+def test_matches_played_out_dealer_hands():
+    deck = Deck(1, rng=BatchedRng(5))
+    outcomes = DealerOutcomes(1)
+    outcomes.remove(6)
+    expected = outcomes.distribution(6)
+    assert np.isclose(expected.sum(), 1)
+
+    # play the dealer out with the table's rules from a one deck shoe missing a 6
+    counts = np.zeros(len(DEALER_OUTCOMES))
+    for _ in range(10000):
+        deck.shuffle()
+        cards = [c for c in deck.deck if c.value != 6 or c.suit != 'clubs']
+        hand = Hand([Card('clubs', 6), cards[0]])
+        i = 1
+        while hand.sum()[0] <= 16 or (hand.sum()[0] == 17 and not hand.sum()[1]):
+            hand.add_card(cards[i])
+            i += 1
+        total = hand.sum()[0]
+        counts[total - 17 if total <= 22 else OUTCOME_BUST] += 1
+    assert np.allclose(counts / counts.sum(), expected, atol=0.02)
+
+def test_incremental_key_and_cache():
+    outcomes = DealerOutcomes(2)
+    fresh_key = outcomes.key
+    outcomes.remove(10)
+    first = outcomes.distribution(10)
+    # a ten upcard from a full shoe has a blackjack whenever the hole card is an ace
+    assert np.isclose(first[OUTCOME_BLACKJACK], 8 / 103)
+
+    outcomes.remove(1)
+    outcomes.add(1)
+    assert outcomes.distribution(10) is first
+    outcomes.add(10)
+    assert outcomes.key == fresh_key == outcomes.pack(outcomes.full_counts)
+
+    peeked = outcomes.distribution(1, no_blackjack=True)
+    assert peeked[OUTCOME_BLACKJACK] == 0 and np.isclose(peeked.sum(), 1)
+
+def test_stand_value():
+    outcomes = DealerOutcomes()
+    outcomes.remove(6)
+    # standing on 16 wins when the dealer busts, pushes on 22 and loses to anything the dealer stands on
+    dealer = outcomes.distribution(6)
+    assert np.isclose(outcomes.stand_value(6, 16), dealer[OUTCOME_BUST] - dealer[:5].sum())
+    assert outcomes.stand_value(6, 20) > outcomes.stand_value(6, 17)
+    assert outcomes.stand_value(6, 23) == -1
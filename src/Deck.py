@@ -1,31 +1,48 @@
-from random import randint
+import numpy as np
 
 from src.constants import *
-from src.Card import Card
+from src.Card import CARDS, Card
+from src.Rng import BatchedRng
+
+# compact card codes: code = suit index * len(VALUES) + value index
+# the value index keeps 10/J/Q/K apart, the value itself is looked up in CODE_VALUES
+NUM_CARD_CODES = len(SUITS) * len(VALUES)
+CODE_VALUES = np.array([v for _ in SUITS for v in VALUES], dtype=np.int8)
+CODE_CARDS = CARDS
 
 class Deck:
-    def __init__(self, num_decks=NUM_DECKS) -> None:
-        deck = []
-        for _ in range(num_decks):
-            for s in SUITS:
-                for v in VALUES:
-                    c = Card(s, v)
-                    deck += [c]
+    def __init__(self, num_decks=NUM_DECKS, penetration=DECK_PENETRATION, rng: BatchedRng = None) -> None:
+        # every deck in the shoe shares the same 52 interned cards
+        deck = CARDS * num_decks
         self.deck = deck
         self.index = 0
 
+        # the cut card sits this many cards into the shoe
+        self.cut_index = int(len(deck) * penetration)
+        self.is_shuffled = False
+        self.rng = rng or BatchedRng()
+
+        # lifetime counters; cards before the current position are added up on every reset or wrap,
+        # so next() doesn't pay for the count
+        self.shuffles = 0
+        self.cards_dealt = 0
+
     def len(self):
         return len(self.deck)
 
+    # one vectorized permutation from the rng rather than a swap per card
     def shuffle(self) -> None:
-        size = len(self.deck)
-        # new_indexes = range(size)
-        for thisIndex in range(size):
-            otherIndex = randint(thisIndex, size - 1)
-            # swap this and other
-            buffer = self.deck[thisIndex]
-            self.deck[thisIndex] = self.deck[otherIndex]
-            self.deck[otherIndex] = buffer
+        deck = self.deck
+        self.deck = [deck[i] for i in self.rng.generator.permutation(len(deck)).tolist()]
+        self.is_shuffled = True
+        self.shuffles += 1
+
+    def cards_drawn(self) -> int:
+        return self.cards_dealt + self.index
+
+    # true once the cut card has come out (or the shoe was never shuffled)
+    def needs_shuffle(self) -> bool:
+        return not self.is_shuffled or self.index >= self.cut_index
 
     def fan(self):
         line = ''
@@ -39,9 +56,19 @@ class Deck:
         c = self.deck[self.index]
         self.index = (self.index + 1) % len(self.deck)
         if self.index == 0:
+            self.cards_dealt += len(self.deck)
             self.shuffle()
         return c
 
+    # k cards in one slice, card by card only when they wrap around the shoe
+    def draw_cards(self, k: int):
+        end = self.index + k
+        if end < len(self.deck):
+            cards = self.deck[self.index:end]
+            self.index = end
+            return cards
+        return [self.next() for _ in range(k)]
+
     # def __next__(self):
     #     c = self.deck[self._index]
     #     if self._index < len(cards):
@@ -51,6 +78,7 @@ class Deck:
     #     return StopIteration
 
     def reset(self):
+        self.cards_dealt += self.index
         self.index = 0
         self.shuffle()
 
@@ -73,3 +101,77 @@ class DeckIterator:
             return result
         raise StopIteration
 
+
+
+# numpy-backed shoe, cards are kept as an integer array of card codes
+# shuffles with a single vectorized permutation and can hand out k cards per call
+class ArrayDeck:
+    def __init__(self, num_decks=NUM_DECKS, penetration=DECK_PENETRATION, seed=None, rng: BatchedRng = None) -> None:
+        self.num_decks = num_decks
+        self.rng = rng or BatchedRng(seed)
+        self.codes = np.tile(np.arange(NUM_CARD_CODES, dtype=np.uint8), num_decks)
+        self.index = 0
+
+        self.cut_index = int(len(self.codes) * penetration)
+        self.is_shuffled = False
+
+        # same lifetime counters as Deck
+        self.shuffles = 0
+        self.cards_dealt = 0
+
+    def len(self):
+        return len(self.codes)
+
+    def shuffle(self) -> None:
+        self.rng.generator.shuffle(self.codes)
+        self.is_shuffled = True
+        self.shuffles += 1
+
+    def cards_drawn(self) -> int:
+        return self.cards_dealt + self.index
+
+    def needs_shuffle(self) -> bool:
+        return not self.is_shuffled or self.index >= self.cut_index
+
+    def fan(self):
+        print(' '.join(str(CODE_CARDS[c]) for c in self.codes))
+
+    # draw k card codes at once, wrapping around (and reshuffling) like next()
+    def draw(self, k: int) -> np.ndarray:
+        end = self.index + k
+        if end < len(self.codes):
+            drawn = self.codes[self.index:end].copy()
+            self.index = end
+            return drawn
+
+        # take what is left, then shuffle and keep going from the top
+        drawn = self.codes[self.index:].copy()
+        self.cards_dealt += len(self.codes)
+        self.index = 0
+        self.shuffle()
+        if len(drawn) < k:
+            drawn = np.concatenate((drawn, self.draw(k - len(drawn))))
+        return drawn
+
+    def draw_values(self, k: int) -> np.ndarray:
+        return CODE_VALUES[self.draw(k)]
+
+    def draw_cards(self, k: int):
+        return [CODE_CARDS[c] for c in self.draw(k).tolist()]
+
+    def next(self) -> Card:
+        c = CODE_CARDS[self.codes[self.index]]
+        self.index += 1
+        if self.index == len(self.codes):
+            self.cards_dealt += len(self.codes)
+            self.index = 0
+            self.shuffle()
+        return c
+
+    def reset(self):
+        self.cards_dealt += self.index
+        self.index = 0
+        self.shuffle()
+
+    def __iter__(self):
+        return iter([CODE_CARDS[c] for c in self.codes])
@@ -1,10 +1,26 @@
-from src.Deck import Deck
+import numpy as np
+
+from src.constants import NUM_DECKS
+from src.Deck import Deck, ArrayDeck
+from src.Rng import BatchedRng
 
 
 def test_shuffleDeck():
     d = Deck()
+    before = sorted((c.suit, c.value) for c in d.deck)
     d.shuffle()
     d.fan()
+    # a shuffle only moves cards around, and the same seed shuffles the same way
+    assert sorted((c.suit, c.value) for c in d.deck) == before
+    assert Deck(rng=BatchedRng(4)).draw_cards(20) == Deck(rng=BatchedRng(4)).draw_cards(20)
+
+    # one slice from the shoe deals the same cards as drawing them one at a time
+    one_by_one = Deck(1, rng=BatchedRng(5))
+    one_by_one.shuffle()
+    sliced = Deck(1, rng=BatchedRng(5))
+    sliced.shuffle()
+    assert sliced.draw_cards(10) == [one_by_one.next() for _ in range(10)]
+    assert sliced.index == one_by_one.index == 10
 
 def test_prepDeck():
     d = Deck()
@@ -12,4 +28,46 @@ def test_prepDeck():
     print('prep_deck')
     print(d.next())
     print(d.next())
-    print(d.next())
\ No newline at end of file
+    print(d.next())
+
+def test_arrayDeck():
+    d = ArrayDeck(seed=7)
+    d.shuffle()
+    assert d.len() == NUM_DECKS * 52
+    # a shuffle only moves cards around
+    assert sorted(d.codes.tolist()) == sorted(np.tile(np.arange(52), NUM_DECKS).tolist())
+
+    drawn = d.draw(5)
+    assert len(drawn) == 5
+    assert d.index == 5
+    print([str(c) for c in d.draw_cards(3)], d.draw_values(4))
+
+def test_arrayDeckWrap():
+    d = ArrayDeck(1, seed=3)
+    d.draw(50)
+    drawn = d.draw(5)
+    # two left over from the old order, three from the reshuffled shoe
+    assert len(drawn) == 5
+    assert d.index == 3
+
+def test_cutCard():
+    d = Deck(1, penetration=0.5)
+    assert d.needs_shuffle()
+    d.reset()
+    assert not d.needs_shuffle()
+    for _ in range(25):
+        d.next()
+    assert not d.needs_shuffle()
+    d.next()
+    # the cut card is out, the table reshuffles before the next round
+    assert d.needs_shuffle()
+
+def test_drawCounters():
+    for deck in (Deck(1, penetration=0.5), ArrayDeck(1, penetration=0.5)):
+        deck.reset()
+        deck.draw_cards(30)
+        assert deck.cards_drawn() == 30 and deck.shuffles == 1
+        # the cut card is out, a reset keeps the count
+        deck.reset()
+        deck.draw_cards(60)
+        assert deck.cards_drawn() == 90 and deck.shuffles == 3
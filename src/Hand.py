@@ -1,11 +1,28 @@
-import copy
 from typing import List, Tuple
 
 from src.Card import Card
+from src.StateEncoder import COMPOSITION_INDEX, BUST
 
 class Hand:
     def __init__(self, cards: List[Card]) -> None:
-        self.cards = cards
+        self.cards = []
+
+        # running totals, kept up to date by add_card so reads never re-scan
+        # hard_total counts every ace as 1, at most one ace can ever count as 11
+        self.hard_total = 0
+        self.num_aces = 0
+        self.total = 0
+        self.is_hard = True
+        self.is_pair = False
+
+        # histogram of card values (index 1-10), gives the canonical ordering without sorting cards
+        self.value_counts = [0] * 11
+        self._sorted_values = None
+        # dense id of the histogram in COMPOSITION_INDEX, BUST once the hard total passes 21
+        self.composition_id = 0
+
+        for c in cards:
+            self.add_card(c)
 
     def __str__(self) -> str:
         return f'{[str(c) for c in self.cards]}'
@@ -20,48 +37,49 @@ class Hand:
     def add_card(self, c: Card):
         self.cards.append(c)
 
+        self.hard_total += c.value
+        self.value_counts[c.value] += 1
+        self._sorted_values = None
+        if self.composition_id != BUST:
+            self.composition_id = COMPOSITION_INDEX.transitions[self.composition_id][c.value]
+        if c.value == 1:
+            self.num_aces += 1
+
+        # one ace counts as 11 whenever that doesn't bust the hand
+        if self.num_aces and self.hard_total + 10 <= 21:
+            self.total = self.hard_total + 10
+            self.is_hard = False
+        else:
+            self.total = self.hard_total
+            self.is_hard = True
+
+        self.is_pair = len(self.cards) == 2 and self.cards[0].value == c.value
+
     def sum(self) -> Tuple[int, bool]:
-        if not self.cards or len(self.cards) == 0:
-            return 0
-
-        total = 0
-        isHard = True
-        containsAtLeastOneAce = False
-        for x in self.cards:
-            # print(sum)
-            # if it's an ace, check to see if its hard
-            if x.value == 1:
-                if containsAtLeastOneAce:
-                    # there can only be at most one ace that's hard
-                    # the first one seen (if previously) could still be reduced if we overflow, if we can (i.e. if notisHard)
-                    # we can only ever add one, but if needed, we should reduce the first one
-                    total += 1
-                    if total > 21 and not isHard:
-                        total -= 10  # remove the first ace, make it a 1
-                        isHard = True
-
-                else:
-                    # this is the first (or only) ace we see, check for 11 compatibility
-                    containsAtLeastOneAce = True
-                    if total + 11 < 21:
-                        isHard = False
-                        total += 11
-                    else:
-                        isHard = True  # this one is technically redundant
-                        total += 1
-            else:
-                total += x.value
-                if containsAtLeastOneAce and total > 21 and not isHard:
-                    total -= 10  # remove the first ace, make it a 1
-                    isHard = True
-
-        return total, isHard
+        return self.total, self.is_hard
+
+    def is_bust(self) -> bool:
+        return self.total > 21
+
+    def can_split(self) -> bool:
+        return self.is_pair
+
+    def can_double(self) -> bool:
+        return len(self.cards) == 2
+
+    # card values in ascending order, read straight off the histogram and cached until the next card
+    def sorted_values(self) -> Tuple[int, ...]:
+        if self._sorted_values is None:
+            self._sorted_values = tuple(v for v in range(1, 11) for _ in range(self.value_counts[v]))
+        return self._sorted_values
+
+    def composition(self) -> Tuple[int, ...]:
+        return tuple(self.value_counts[1:])
 
     def sort(self):
-        sorted_cards = copy.deepcopy(self.cards)
-        sorted_cards.sort(key=lambda c: c.value)
-        return Hand(sorted_cards)
+        # same card objects, just reordered
+        return Hand(sorted(self.cards, key=lambda c: c.value))
 
     def is_blackjack(self) -> bool:
-        h = self.sort()
-        return len(self.cards) == 2 and h.get(0).value == 1 and h.get(1).value == 10
+        # an ace and a ten are the only two cards that make a soft 21
+        return len(self.cards) == 2 and self.total == 21
@@ -37,4 +37,42 @@ def test_isBlackjack():
     h = Hand([c1, c2])
     print(h)
     print(h.is_blackjack())
-    assert(h.is_blackjack())
\ No newline at end of file
+    assert(h.is_blackjack())
+
+
+def test_incrementalSum():
+    h = Hand([Card('spades', 10), Card('hearts', 1)])
+    # order of the ace doesn't matter
+    assert h.sum() == (21, False)
+    assert h.is_blackjack()
+
+    h.add_card(Card('clubs', 5))
+    assert h.sum() == (16, True)
+    assert not h.is_blackjack()
+    assert not h.can_double()
+
+    h.add_card(Card('clubs', 9))
+    assert h.is_bust()
+
+def test_pairs():
+    h = Hand([Card('spades', 8), Card('hearts', 8)])
+    assert h.can_split()
+    h.add_card(Card('clubs', 8))
+    assert not h.can_split()
+    assert not Hand([Card('spades', 8), Card('hearts', 9)]).can_split()
+
+def test_sortedValues():
+    c1 = Card('diamonds', 5)
+    c2 = Card('hearts', 1)
+    c3 = Card('spades', 10)
+    h = Hand([c1, c2, c3])
+    assert h.sorted_values() == (1, 5, 10)
+    assert h.composition() == (1, 0, 0, 0, 1, 0, 0, 0, 0, 1)
+
+    # sorting reorders the same cards, nothing gets copied
+    s = h.sort()
+    assert [str(c) for c in s.cards] == ['1', '5', '10']
+    assert s.get(0) is c2
+
+    h.add_card(Card('clubs', 2))
+    assert h.sorted_values() == (1, 2, 5, 10)
@@ -0,0 +1,84 @@
+from typing import List
+
+import numpy as np
+
+from src.constants import *
+
+
+class MLP:
+    # small fully connected network in plain numpy: relu hidden layers, linear outputs
+    # every call works on a batch of rows, one row per hand
+    # trained by regressing the output of the action that was taken onto the return it got, with adam steps
+    def __init__(self, layer_sizes: List[int], rng: np.random.Generator = None,
+                 learning_rate: float = NN_LEARNING_RATE) -> None:
+        rng = rng if rng is not None else np.random.default_rng()
+        self.layer_sizes = list(layer_sizes)
+        self.learning_rate = learning_rate
+        # he initialization, the biases start at 0
+        self.weights = [rng.normal(0, np.sqrt(2 / fan_in), (fan_in, fan_out))
+                        for fan_in, fan_out in zip(layer_sizes[:-1], layer_sizes[1:])]
+        self.biases = [np.zeros(fan_out) for fan_out in layer_sizes[1:]]
+
+        # adam moments, one per parameter array
+        self.steps = 0
+        self.moments = [np.zeros_like(p) for p in self.parameters()]
+        self.velocities = [np.zeros_like(p) for p in self.parameters()]
+
+    def parameters(self) -> List[np.ndarray]:
+        return self.weights + self.biases
+
+    def forward(self, x: np.ndarray, activations: list = None) -> np.ndarray:
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            if activations is not None:
+                activations.append(x)
+            x = x @ w + b
+            if i < len(self.weights) - 1:
+                x = np.maximum(x, 0)
+        return x
+
+    # one adam step on the squared error between the taken actions' outputs and their targets, returns the loss
+    # weights scale each row's share of the loss, e.g. importance sampling weights from a replay buffer
+    def train(self, x: np.ndarray, actions: np.ndarray, targets: np.ndarray, weights: np.ndarray = None) -> float:
+        activations = []
+        output = self.forward(x, activations)
+        rows = np.arange(len(x))
+        error = output[rows, actions] - targets
+        weights = np.ones(len(x)) if weights is None else weights
+
+        grad_output = np.zeros_like(output)
+        grad_output[rows, actions] = 2 * weights * error / len(x)
+        grad_weights, grad_biases = [], []
+        for i in reversed(range(len(self.weights))):
+            grad_weights.insert(0, activations[i].T @ grad_output)
+            grad_biases.insert(0, grad_output.sum(axis=0))
+            if i > 0:
+                # back through the relu of the layer below
+                grad_output = (grad_output @ self.weights[i].T) * (activations[i] > 0)
+
+        self.steps += 1
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+        for param, grad, moment, velocity in zip(self.parameters(), grad_weights + grad_biases,
+                                                 self.moments, self.velocities):
+            moment *= beta1
+            moment += (1 - beta1) * grad
+            velocity *= beta2
+            velocity += (1 - beta2) * grad ** 2
+            corrected = moment / (1 - beta1 ** self.steps)
+            param -= self.learning_rate * corrected / (np.sqrt(velocity / (1 - beta2 ** self.steps)) + eps)
+        return float(np.mean(weights * error ** 2))
+
+    # the arrays np.savez needs to rebuild this network
+    def state_dict(self) -> dict:
+        state = {'layer_sizes': np.array(self.layer_sizes)}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            state[f'weight_{i}'] = w
+            state[f'bias_{i}'] = b
+        return state
+
+    def load_state_dict(self, state):
+        assert list(state['layer_sizes']) == self.layer_sizes, 'saved network has a different shape'
+        self.weights = [np.array(state[f'weight_{i}']) for i in range(len(self.weights))]
+        self.biases = [np.array(state[f'bias_{i}']) for i in range(len(self.biases))]
+        self.steps = 0
+        self.moments = [np.zeros_like(p) for p in self.parameters()]
+        self.velocities = [np.zeros_like(p) for p in self.parameters()]
@@ -0,0 +1,26 @@
+import numpy as np
+
+from src.NeuralNet import MLP
+
+def test_forward_is_batched():
+    network = MLP([3, 8, 2], np.random.default_rng(0))
+    x = np.random.default_rng(1).normal(size=(5, 3))
+    batch = network.forward(x)
+    assert batch.shape == (5, 2)
+    assert np.allclose(batch[2], network.forward(x[2:3])[0])
+
+def test_train_fits_taken_actions():
+    rng = np.random.default_rng(0)
+    network = MLP([2, 16, 2], rng, learning_rate=0.01)
+    x = rng.uniform(-1, 1, size=(512, 2))
+    actions = rng.integers(0, 2, size=512)
+    # action 0 is worth x0, action 1 is worth -x1
+    targets = np.where(actions == 0, x[:, 0], -x[:, 1])
+    first = network.train(x, actions, targets)
+    for _ in range(500):
+        last = network.train(x, actions, targets)
+    assert last < first / 10
+
+    copy = MLP([2, 16, 2])
+    copy.load_state_dict(network.state_dict())
+    assert np.allclose(copy.forward(x), network.forward(x))
@@ -0,0 +1,78 @@
+import json
+
+import numpy as np
+
+from src.constants import *
+from src.DealerOutcomes import DealerOutcomes
+from src.StateEncoder import COMPOSITION_INDEX, BUST
+
+HIT, STAY, SPLIT, DOUBLE = (ACTIONS.index(a) for a in ('hit', 'stay', 'split', 'double'))
+
+
+# expected return of every action for every (dealer upcard, player hand composition), by this table's rules:
+# the dealer hits soft 17, pushes on 22 and peeks for blackjack on an ace or ten, so players only ever
+# decide against a dealer without one; a double draws one card and stands on the same flat bet,
+# a split is played as a stay
+# the player's draws come from the shoe minus the upcard and the player's own cards, the dealer's
+# outcomes are taken from the shoe minus the upcard
+# values[upcard - 1, composition id, action], -inf for actions the hand can't take, nan for hands under two cards
+def solve_strategy(num_decks: int = NUM_DECKS) -> np.ndarray:
+    index = COMPOSITION_INDEX
+    values = np.full((10, len(index), len(ACTIONS)), np.nan)
+    # hands with more cards first, everything a hand can draw into is solved before it
+    order = sorted(range(len(index)), key=lambda composition_id: -index.num_cards[composition_id])
+
+    for upcard in range(1, 11):
+        dealer = DealerOutcomes(num_decks)
+        dealer.remove(upcard)
+        peeked = upcard in (1, 10)
+        stand = [dealer.stand_value(upcard, total, peeked) for total in range(22)]
+
+        # best of hit and stay once the hand has taken a card, doubling and splitting are gone by then
+        best = [0.0] * len(index)
+        for composition_id in order:
+            total, _ = index.total_of(composition_id)
+            counts = index.compositions[composition_id]
+            # hands holding more of a value than the shoe has are unreachable, they just draw none of it
+            draws = [max(0, dealer.counts[v] - counts[v - 1]) for v in range(1, 11)]
+            remaining = sum(draws)
+
+            hit, double = 0.0, 0.0
+            for v, count in zip(range(1, 11), draws):
+                drawn = index.transitions[composition_id][v]
+                if drawn == BUST:
+                    hit -= count
+                    double -= count
+                else:
+                    hit += count * best[drawn]
+                    double += count * stand[index.total_of(drawn)[0]]
+            hit /= remaining
+            double /= remaining
+            best[composition_id] = max(hit, stand[total])
+
+            num_cards = index.num_cards[composition_id]
+            if num_cards < 2:
+                continue
+            row = values[upcard - 1, composition_id]
+            row[:] = -np.inf
+            row[HIT] = hit
+            row[STAY] = stand[total]
+            if num_cards == 2:
+                row[DOUBLE] = double
+                if max(counts) == 2:
+                    row[SPLIT] = stand[total]
+    return values
+
+
+# argmax over the legal actions, ties go to the lower action index so a split never beats the stay it plays as
+def strategy_actions(values: np.ndarray) -> np.ndarray:
+    return np.argmax(np.nan_to_num(values, nan=-np.inf), axis=2)
+
+
+def save_strategy(path: str, values: np.ndarray, num_decks: int):
+    np.savez(path, values=values, metadata=np.array(json.dumps({'num_decks': num_decks})))
+
+
+def load_strategy(path: str):
+    with np.load(path) as data:
+        return data['values'], json.loads(str(data['metadata']))
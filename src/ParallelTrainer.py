@@ -0,0 +1,135 @@
+import logging
+import multiprocessing
+
+import numpy as np
+
+from src.constants import *
+from src.BlackjackTable import BlackjackTable
+from src.Deck import Deck
+from src.Player import QPlayer
+from src.Rng import BatchedRng
+
+
+# runs inside each worker process: its own table, random stream and copy of the player
+def _worker_main(conn, name: str, seed: np.random.SeedSequence, num_players: int, num_decks: int, learning: str):
+    # workers are headless, the per-hand table logging would only slow them down
+    logging.disable(logging.INFO)
+    rng = BatchedRng(seed)
+
+    table = BlackjackTable(num_players - 1, deck=Deck(num_decks, rng=rng.spawn(1)[0]), rng=rng)
+    player = QPlayer(name, 0, rng=rng.spawn(1)[0], learning=learning)
+    table.add_player(player)
+    states = player.decision_engine.states
+
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+
+        # start from the broadcast master table, play, then report what changed
+        values, visits, episodes, num_rounds = message
+        states.assign(values, visits)
+        # every worker explores on the master's schedule
+        player.decision_engine.episodes = episodes
+        before = states.copy()
+        score_before = dict(player.score)
+        chips_before = player.chips
+
+        for _ in range(num_rounds):
+            table.complete_a_round()
+
+        value_deltas, visit_deltas = states.diff(before)
+        score_deltas = {k: player.score[k] - score_before[k] for k in player.score.keys()}
+        conn.send((value_deltas, visit_deltas, score_deltas, player.chips - chips_before, num_rounds))
+    conn.close()
+
+
+# folds every worker's (value deltas, visit deltas) into one pair for QTable.merge
+# weights deltas are counts of rewards and add up; td/mc deltas are each worker's step from the same master values
+# toward its own targets, so per (state, action) they are averaged over the workers that changed that entry,
+# otherwise W workers would step W times too far
+def combine_deltas(worker_deltas, learning: str):
+    value_deltas = sum(values for values, _ in worker_deltas)
+    visit_deltas = sum(visits for _, visits in worker_deltas)
+    if learning != 'weights':
+        contributors = sum((values != 0).astype(np.int64) for values, _ in worker_deltas)
+        value_deltas = value_deltas / np.maximum(contributors, 1)
+    return value_deltas, visit_deltas
+
+
+class ParallelTrainer:
+    # trains one QPlayer with num_workers self-play processes
+    # every sync_interval rounds each worker's q table deltas and visit counts are summed into
+    # the player's (master) table, which is then broadcast back to all workers
+    def __init__(self, player: QPlayer, num_workers: int = multiprocessing.cpu_count(),
+                 sync_interval: int = 1000, seed: int = None, num_players: int = 1, num_decks: int = NUM_DECKS) -> None:
+        self.player = player
+        self.num_workers = num_workers
+        self.sync_interval = sync_interval
+        self.logger = logging.getLogger(__name__)
+
+        # independent, reproducible random streams for each worker
+        seeds = np.random.SeedSequence(seed).spawn(num_workers)
+        self.connections = []
+        self.workers = []
+        for worker_seed in seeds:
+            parent_conn, child_conn = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=_worker_main,
+                                             args=(child_conn, player.get_name(), worker_seed, num_players, num_decks,
+                                                   player.decision_engine.learning),
+                                             daemon=True)
+            worker.start()
+            child_conn.close()
+            self.connections.append(parent_conn)
+            self.workers.append(worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # plays num_hands hands in total across all workers, merging every sync_interval rounds
+    def train(self, num_hands: int):
+        states = self.player.decision_engine.states
+        remaining = num_hands
+        while remaining > 0:
+            # split what is left evenly, but never more than sync_interval rounds between merges
+            per_worker = min(self.sync_interval, -(-remaining // self.num_workers))
+            active = []
+            for conn in self.connections:
+                rounds = min(per_worker, remaining)
+                if rounds == 0:
+                    break
+                remaining -= rounds
+                conn.send((states.values, states.visits, self.player.decision_engine.episodes, rounds))
+                active.append(conn)
+
+            # reduce every worker's deltas into the master table
+            learning = self.player.decision_engine.learning
+            worker_deltas = []
+            for conn in active:
+                value_deltas, visit_deltas, score_deltas, chips_delta, rounds = conn.recv()
+                worker_deltas.append((value_deltas, visit_deltas))
+                for k, v in score_deltas.items():
+                    self.player.score[k] = self.player.score.get(k, 0) + v
+                self.player.chips += chips_delta
+                self.player.hands_seen += rounds
+                self.player.decision_engine.episodes += rounds
+            # weights workers clamp at 0 on their own, the summed deltas can still overshoot;
+            # td/mc values are expected returns and go negative
+            states.merge(*combine_deltas(worker_deltas, learning), floor=0 if learning == 'weights' else None)
+
+            # merged deltas never went through the player's journal, fold them into a snapshot instead
+            if self.player.journal:
+                self.player.journal.compact(states, self.player.get_metadata())
+            self.logger.info(f'merged {len(active)} workers, {self.player.hands_seen} hands seen')
+
+    def close(self):
+        for conn in self.connections:
+            conn.send(None)
+            conn.close()
+        for worker in self.workers:
+            worker.join()
+        self.connections = []
+        self.workers = []
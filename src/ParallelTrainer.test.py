@@ -0,0 +1,53 @@
+import numpy as np
+
+from src.ParallelTrainer import ParallelTrainer, combine_deltas
+from src.Player import QPlayer
+
+def test_parallel_training():
+    p1 = QPlayer('danny', 1000)
+    with ParallelTrainer(p1, num_workers=3, sync_interval=50, seed=1) as trainer:
+        trainer.train(400)
+
+    assert p1.hands_seen == 400
+    assert sum(p1.score.values()) == 400
+    assert p1.get_metadata()['engine']['num_states'] > 0
+    assert p1.decision_engine.states.values.min() >= 0
+
+
+def test_td_workers_share_one_fixed_point():
+    # each worker steps the same master values toward its own noisy estimate of the same targets
+    targets = np.array([[0.5, -0.25, 0.0, 1.0]])
+    noise = np.random.default_rng(0)
+
+    # split_actions has worker i only take action i % 4, so workers change different entries of the same state
+    def run(num_workers, learning, split_actions=False, rounds=200):
+        values = np.zeros((1, 4))
+        for _ in range(rounds):
+            worker_deltas = [(0.5 * (targets + noise.normal(0, 0.01, targets.shape) - values)
+                              * (np.arange(4) == i % 4 if split_actions else 1), np.ones(1, dtype=np.int64))
+                             for i in range(num_workers)]
+            value_deltas, _ = combine_deltas(worker_deltas, learning)
+            values = values + value_deltas
+        return values
+
+    assert np.allclose(run(1, 'td'), targets, atol=0.05)
+    assert np.allclose(run(4, 'td'), targets, atol=0.05)
+    assert np.allclose(run(4, 'td', split_actions=True), targets, atol=0.05)
+    # a worker alone on its action keeps its whole step, so splitting the actions doesn't slow anything down
+    assert np.allclose(run(4, 'td', split_actions=True, rounds=5), run(1, 'td', rounds=5), atol=0.05)
+    combined, _ = combine_deltas([(np.array([[0.5, 0, 0, 0]]), np.ones(1)), (np.array([[0, -0.2, 0, 0]]), np.ones(1))], 'td')
+    assert combined.tolist() == [[0.5, -0.2, 0, 0]]
+    # summed like weights rewards, four steps of half the error overshoot and never settle
+    assert not np.allclose(run(4, 'weights'), targets, atol=0.05)
+
+
+def test_parallel_td_training():
+    p1 = QPlayer('danny', 1000, learning='td')
+    with ParallelTrainer(p1, num_workers=3, sync_interval=50, seed=2) as trainer:
+        trainer.train(600)
+
+    assert p1.decision_engine.episodes == 600
+    # averaged steps keep every expected return within the +-1 a flat bet can win or lose
+    values = p1.decision_engine.states.values
+    assert values.min() < 0
+    assert -1 <= values.min() and values.max() <= 1
@@ -1,16 +1,27 @@
 import json
 import logging
 import os
-import random
 from abc import ABC, abstractmethod
 
+import numpy as np
+
 from src.constants import *
 from src.Card import Card
 from src.Hand import Hand
+from src.NeuralNet import MLP
+from src.OptimalStrategy import load_strategy, save_strategy, solve_strategy, strategy_actions
+from src.QJournal import QJournal
+from src.QStore import QStore
+from src.QTable import LEGAL_ACTION_MASKS, QTable
+from src.Rng import BatchedRng
+from src.StateEncoder import COMPOSITION_INDEX, StateEncoder
 
 class BaseDecisionEngine(ABC):
-    def __init__(self):
+    def __init__(self, rng: BatchedRng = None):
         self.str_name = ''
+        self.rng = rng or BatchedRng()
+        # the table's ShoeTracker once the player sits down, for engines that play the count
+        self.shoe = None
 
     def __str__(self):
         return self.str_name
@@ -23,22 +34,59 @@ class BaseDecisionEngine(ABC):
     def stage_action(self, dealer_card: Card, hand: Hand):
         pass
 
+    # one decision for each row of (dealer upcard value, hand composition id, legal action mask index),
+    # the rows can come from any number of seats and tables; returns an array of action indices
+    # engines that can vectorize override this, the default asks stage_action row by row
+    def stage_actions(self, upcards, hand_states, legal) -> np.ndarray:
+        return np.array([self.stage_action(Card(SUITS[0], int(upcard)),
+                                           Hand([Card(SUITS[0], v) for v in COMPOSITION_INDEX.values_of(hand_state)]))
+                         for upcard, hand_state in zip(upcards, hand_states)], dtype=np.int64)
+
 class QDecisionEngine(BaseDecisionEngine):
-    def __init__(self):
-        super().__init__()
+    # learning is one of the Q_LEARNING modes; 'weights' samples actions in proportion to the row,
+    # 'td' and 'mc' play epsilon-greedy on the row's expected returns and back up a whole round at once
+    def __init__(self, rng: BatchedRng = None, learning: str = Q_LEARNING, learning_rate: float = Q_LEARNING_RATE,
+                 discount: float = Q_DISCOUNT):
+        super().__init__(rng)
         self.str_name = 'Qstate'
+        assert learning in ('weights', 'td', 'mc'), f'unknown learning mode {learning}'
+        self.learning = learning
+        self.learning_rate = learning_rate
+        self.discount = discount
+        # rounds learned from, counted by the player; drives the td/mc exploration schedule
+        self.episodes = 0
 
         # specific to this
-        self.states = {}
+        # q states are rows of a dense table, indexed by the encoder's integer state id
+        self.encoder = StateEncoder()
+        self.states = QTable(self.encoder.num_states, default_vector=self.initial_vector())
         self.last_states = {}
         self.last_state_key = ''
         self.last_state_action_index = 0
 
     def get_metadata(self):
         return {
-            'num_states': len(self.states.keys())
+            'num_states': len(self.states),
+            'learning': self.learning,
+            'episodes': self.episodes
         }
 
+    # what an unvisited row holds: even sampling weights, or an expected return of 0
+    def initial_vector(self):
+        return DEFAULT_VECTOR if self.learning == 'weights' else [0.0] * len(ACTIONS)
+
+    def epsilon(self) -> float:
+        return max(Q_EPSILON_MIN, Q_EPSILON_START * Q_EPSILON_DECAY ** self.episodes)
+
+    # best legal action of each row of values, swapped for a random legal one epsilon of the time
+    def epsilon_greedy(self, values: np.ndarray, legal: np.ndarray) -> np.ndarray:
+        actions = np.argmax(np.where(LEGAL_ACTION_MASKS[legal] > 0, values, -np.inf), axis=1)
+        epsilon = self.epsilon()
+        for i in range(len(actions)):
+            if self.rng.random() < epsilon:
+                actions[i] = self.rng.choice_index(LEGAL_ACTION_MASKS[legal[i]].tolist())
+        return actions
+
     def stage_action(self, dealer_card, hand):
         # there are a few things any player can do
         # 0 hit (if possible)
@@ -50,50 +98,262 @@ class QDecisionEngine(BaseDecisionEngine):
         # the 'action' will be the one that was made, small cache of sequences are kept in memory
         # if action is good/bad (tbd after this method), memory updated for probability vector
 
-        # resolve key
+        # resolve key, every row starts out as initial_vector(): DEFAULT_VECTOR for weights, zeros for td and mc
         key = self.generate_state_key(dealer_card, hand)
-        if key not in self.states.keys():
-            # initialize it, and make it all vectors possible
-            self.states[key] = DEFAULT_VECTOR
+        self.states.visit(key)
 
-        token_vector = self.states[key]
         self.last_state_key = key
 
-        # if i cannot split, clear out that value in vector
-        if hand.size() > 2 or hand.get(0).value != hand.get(1).value:
-            token_vector[2] = 0
-
-        # if i cannot double, clear out that value in vector
-        if hand.size() > 2:
-            token_vector[3] = 0
+        # split and double are masked out when the hand can't take them, the stored weights are never touched
+        legal = hand.can_split() | hand.can_double() << 1
 
-        # convert token vector to probability vector and shoot
-        indices = list(range(len(token_vector)))
-        # shoot!
-        self.last_state_action_index = random.choices(indices, weights=token_vector, k=1)[0]
+        if self.learning == 'weights':
+            # shoot! the state's cumulative weights are cached until its weights change
+            self.last_state_action_index = self.states.sample(key, legal, self.rng.random())
+        else:
+            self.last_state_action_index = int(self.epsilon_greedy(self.states.rows([key]), np.array([legal]))[0])
         # save this key
         self.last_states[key] = self.last_state_action_index
+        return self.last_state_action_index
+
+    def stage_actions(self, upcards, hand_states, legal) -> np.ndarray:
+        keys = self.encoder.encode_many(upcards, hand_states)
+        for key in keys.tolist():
+            self.states.visit(key)
+        legal = np.asarray(legal, dtype=np.int64)
+        # the same draws stage_action would take for these rows one at a time
+        if self.learning == 'weights':
+            shots = [self.rng.random() for _ in range(len(keys))]
+            actions = self.states.sample_many(keys, legal, shots)
+        else:
+            actions = self.epsilon_greedy(self.states.rows(keys), legal)
+        self.last_states.update(zip(keys.tolist(), actions.tolist()))
+        if len(keys):
+            self.last_state_key, self.last_state_action_index = int(keys[-1]), int(actions[-1])
+        return actions
+
+
+    def generate_state_key(self, dealer_card: Card, hand: Hand) -> int:
+        return self.encoder.encode(dealer_card, hand)
+
+    # readable keys for the player file, e.g. "9-[['9', '9']]"
+    def export_states(self) -> dict:
+        return {self.encoder.describe(key): self.states[key].tolist() for key in self.states.known_states()}
+
+    def import_states(self, payload: dict) -> int:
+        skipped = 0
+        for key, vector in payload.items():
+            try:
+                state = self.encoder.parse(key)
+            except ValueError:
+                skipped += 1
+                continue
+            self.states.values[state] = vector
+            self.states.visits[state] = max(1, self.states.visits[state])
+        self.states.invalidate()
+        return skipped
+
+    # (state ids, action indices) staged since the last flush, in the order they were staged
+    def last_state_actions(self):
+        states = np.fromiter(self.last_states.keys(), dtype=np.int64, count=len(self.last_states))
+        actions = np.fromiter(self.last_states.values(), dtype=np.int64, count=len(self.last_states))
+        return states, actions
+
+    # 'td'/'mc' backup of the round just finished, one vectorized update over its steps in the order they were taken
+    # reward is the round's net chips, so bigger bets move the table more; only the last step is paid it
+    # 'mc' moves each step toward its discounted return, 'td' toward the discounted best value of the next
+    # step's state, which follows a hit and so only offers hit or stay; every target is read before anything moves
+    # returns (states, actions, the change applied to each)
+    def learn_episode(self, reward: float):
+        states, actions = self.last_state_actions()
+        if not len(states):
+            return states, actions, np.zeros(0)
+
+        rows = self.states.rows(states)
+        if self.learning == 'mc':
+            targets = reward * self.discount ** np.arange(len(states) - 1, -1, -1)
+        else:
+            targets = np.empty(len(states))
+            targets[:-1] = self.discount * np.where(LEGAL_ACTION_MASKS[0] > 0, rows[1:], -np.inf).max(axis=1)
+            targets[-1] = reward
+
+        errors = targets - rows[np.arange(len(states)), actions]
+        return states, actions, self.states.update(states, actions, self.learning_rate * errors)
+
+    # one step q-learning backup over a ReplayBatch, off-policy so the transitions can come from any earlier play
+    # each step is scaled by its importance sampling weight; returns each transition's error before the step,
+    # for ReplayBuffer.update_priorities
+    def learn_replay(self, batch) -> np.ndarray:
+        assert self.learning != 'weights', 'replay backups need a td or mc table'
+        rows = self.states.rows(batch.states)
+        next_rows = self.states.rows(np.maximum(batch.next_states, 0))
+        next_values = np.where(LEGAL_ACTION_MASKS[0] > 0, next_rows, -np.inf).max(axis=1)
+        targets = batch.rewards + self.discount * np.where(batch.dones, 0, next_values)
+        errors = targets - rows[np.arange(len(batch.states)), batch.actions]
+        self.states.update(batch.states, batch.actions, self.learning_rate * batch.weights * errors)
+        return errors
+
+
+
+# network inputs for a batch of hands, one row each:
+# total / 21, soft, pair, can double, upcard one hot (ace first), and optionally true count / 10
+def nn_features(upcards, totals, is_soft, is_pair, can_double, true_counts=None) -> np.ndarray:
+    upcards = np.asarray(upcards)
+    columns = [np.asarray(totals) / 21, is_soft, is_pair, can_double]
+    one_hot = np.arange(1, 11) == upcards[:, None]
+    if true_counts is not None:
+        columns.append(np.asarray(true_counts) / 10)
+    return np.column_stack(columns + [one_hot]).astype(np.float64)
 
 
+class NNDecisionEngine(BaseDecisionEngine):
+    # small numpy network mapping hand features to the expected return of each action,
+    # so one set of weights covers every composition instead of a row per state
+    # plays the best legal action (a random legal one epsilon of the time), and learns by regressing
+    # each decision onto the round's return once a batch of finished rounds has built up
+    def __init__(self, rng: BatchedRng = None, hidden_sizes=NN_HIDDEN_SIZES,
+                 include_true_count: bool = NN_INCLUDE_TRUE_COUNT, epsilon: float = NN_EPSILON,
+                 discount: float = Q_DISCOUNT):
+        super().__init__(rng)
+        self.str_name = 'NeuralNet'
+        self.include_true_count = include_true_count
+        self.epsilon = epsilon
+        self.discount = discount
+        # reads the state ids of replayed transitions, which are recorded by composition with the dealer
+        self.encoder = StateEncoder('composition', include_dealer=True)
+        num_features = 14 + include_true_count
+        self.network = MLP([num_features] + list(hidden_sizes) + [len(ACTIONS)], self.rng.generator)
+        self.train_steps = 0
+        self.last_loss = None
+
+        # features and actions of the round in play, then finished decisions waiting for a training step
+        self.last_decisions = []
+        self.batch_features, self.batch_actions, self.batch_returns = [], [], []
 
-    def generate_state_key(self, dealer_card: Card, hand: Hand) -> str:
-        key = str(hand.sort)
-        if INCLUDE_DEALER_IN_Q_STATE:
-            key = str(dealer_card) + '-' + key
-        return key
+    def get_metadata(self):
+        return {
+            'hidden_sizes': self.network.layer_sizes[1:-1],
+            'include_true_count': self.include_true_count,
+            'train_steps': self.train_steps
+        }
 
+    def features_of(self, dealer_card, hand) -> np.ndarray:
+        true_counts = None
+        if self.include_true_count:
+            true_counts = [self.shoe.true_count() if self.shoe is not None else 0]
+        return nn_features([dealer_card.value], [hand.total], [not hand.is_hard], [hand.is_pair],
+                           [hand.can_double()], true_counts)
 
+    # expected return of every action for a batch of feature rows, one forward pass
+    def action_values(self, features: np.ndarray) -> np.ndarray:
+        return self.network.forward(features)
 
-class NNDecisionEngine(BaseDecisionEngine):
-    def __init__(self):
-        super().__init__()
-        self.str_name = 'NeuralNet'
+    # best legal action for every row, legal is an index into LEGAL_ACTION_MASKS per row
+    def best_actions(self, features: np.ndarray, legal: np.ndarray) -> np.ndarray:
+        values = np.where(LEGAL_ACTION_MASKS[legal] > 0, self.action_values(features), -np.inf)
+        return np.argmax(values, axis=1)
+
+    def stage_action(self, dealer_card, hand):
+        features = self.features_of(dealer_card, hand)
+        legal = hand.can_split() | hand.can_double() << 1
+        if self.rng.random() < self.epsilon:
+            action = self.rng.choice_index(LEGAL_ACTION_MASKS[legal].tolist())
+        else:
+            action = int(self.best_actions(features, np.array([legal]))[0])
+        self.last_decisions.append((features[0], action))
+        return action
+
+    # features of (upcard value, composition id) rows, the true count is the table's current one
+    def row_features(self, upcards, hand_states, true_count: float = None) -> np.ndarray:
+        upcards = np.asarray(upcards, dtype=np.int64)
+        hand_states = np.asarray(hand_states, dtype=np.int64)
+        true_counts = None
+        if self.include_true_count:
+            if true_count is None:
+                true_count = self.shoe.true_count() if self.shoe is not None else 0
+            true_counts = np.full(len(hand_states), true_count)
+        index = COMPOSITION_INDEX
+        return nn_features(upcards, index.totals[hand_states], index.is_soft[hand_states],
+                           index.is_pair[hand_states], index.num_cards_array[hand_states] == 2, true_counts)
+
+    # every row in one forward pass, exploration draws are taken row by row in the same order as stage_action
+    def stage_actions(self, upcards, hand_states, legal) -> np.ndarray:
+        legal = np.asarray(legal, dtype=np.int64)
+        features = self.row_features(upcards, hand_states)
+        actions = self.best_actions(features, legal)
+        for i in range(len(actions)):
+            if self.rng.random() < self.epsilon:
+                actions[i] = self.rng.choice_index(LEGAL_ACTION_MASKS[legal[i]].tolist())
+        self.last_decisions.extend(zip(features, actions.tolist()))
+        return actions
+
+    # the round is over, every decision in it gets the round's return
+    def record_return(self, value: float):
+        for features, action in self.last_decisions:
+            self.batch_features.append(features)
+            self.batch_actions.append(action)
+            self.batch_returns.append(value)
+        self.last_decisions.clear()
+        if len(self.batch_actions) >= NN_TRAIN_BATCH_SIZE:
+            self.train()
+
+    # one training step on a ReplayBatch toward the one step q-learning target, the reward plus the discounted
+    # best hit/stay output for the next state; replays don't record the count, they are read at a true count of 0
+    # returns each transition's error before the step, for ReplayBuffer.update_priorities
+    def train_replay(self, batch) -> np.ndarray:
+        features = self.row_features(*self.encoder.decode_many(batch.states), true_count=0)
+        next_features = self.row_features(*self.encoder.decode_many(np.maximum(batch.next_states, 0)), true_count=0)
+        next_values = np.where(LEGAL_ACTION_MASKS[0] > 0, self.action_values(next_features), -np.inf).max(axis=1)
+        targets = batch.rewards + self.discount * np.where(batch.dones, 0, next_values)
+        errors = targets - self.action_values(features)[np.arange(len(targets)), batch.actions]
+        self.last_loss = self.network.train(features, batch.actions, targets, batch.weights)
+        self.train_steps += 1
+        return errors
+
+    def train(self):
+        if not self.batch_actions:
+            return
+        self.last_loss = self.network.train(np.array(self.batch_features), np.array(self.batch_actions),
+                                            np.array(self.batch_returns))
+        self.train_steps += 1
+        self.batch_features, self.batch_actions, self.batch_returns = [], [], []
+
+
+class OptimalDecisionEngine(BaseDecisionEngine):
+    # plays the expected-value maximizing action for the table's rules, solved once by solve_strategy
+    # the solution is a lookup table over (dealer upcard, hand composition), so stage_action is two list lookups
+    # with a path the table is loaded from there, or solved and written there if it isn't there yet
+    def __init__(self, rng: BatchedRng = None, path: str = None, num_decks: int = NUM_DECKS):
+        super().__init__(rng)
+        self.str_name = 'Optimal'
+        self.num_decks = num_decks
+
+        self.values = None
+        if path and os.path.exists(path):
+            values, metadata = load_strategy(path)
+            if metadata.get('num_decks') == num_decks:
+                self.values = values
+        if self.values is None:
+            self.values = solve_strategy(num_decks)
+            if path:
+                save_strategy(path, self.values, num_decks)
+        self.action_array = strategy_actions(self.values)
+        self.actions = self.action_array.tolist()
 
     def get_metadata(self):
-        return {}
+        return {
+            'num_decks': self.num_decks
+        }
 
     def stage_action(self, dealer_card, hand):
-        return PLAYER_POSSIBLE_ACTIONS[0] # always stay
+        return self.actions[dealer_card.value - 1][hand.composition_id]
+
+    def stage_actions(self, upcards, hand_states, legal) -> np.ndarray:
+        return self.action_array[np.asarray(upcards, dtype=np.int64) - 1, np.asarray(hand_states, dtype=np.int64)]
+
+    # expected return of each action for this hand, -inf for the ones it can't take
+    def action_values(self, dealer_card, hand) -> np.ndarray:
+        return self.values[dealer_card.value - 1, hand.composition_id]
 
 
 class BasePlayer:
@@ -111,9 +371,14 @@ class BasePlayer:
             'draws': 0
         }
         self.hands_seen = 0
+        # number of times this player was written out, including background snapshots of it
+        self.saves = 0
         self.logger = logging.getLogger(__name__)
 
         self.decision_engine = None
+        # the table's ShoeTracker, set by watch_shoe when the player sits down
+        self.shoe = None
+        self.bet_spread = BET_SPREAD
 
     def __str__(self) -> str:
         return f'{self.name}-${self.chips}-{self.hand}'
@@ -149,6 +414,24 @@ class BasePlayer:
     def hit(self, c):
         self.hand.add_card(c)
 
+    ## todo: fix this in case values go negative
+    def last_action_good(self):
+        self.chips += self.pending_chips * 2
+        self.pending_chips = 0
+        self.score['wins'] += 1
+
+    def last_action_bad(self):
+        self.pending_chips = 0
+        self.score['losses'] += 1
+
+    def last_action_neutral(self):
+        self.chips += self.pending_chips
+        self.pending_chips = 0
+        self.score['draws'] += 1
+
+    def ask_for_insurance(self):
+        # todo: decide whether or not to give insurance based on hand
+        return 0
 
     @abstractmethod
     def load_from_file(self):
@@ -162,9 +445,17 @@ class BasePlayer:
     def as_filename(self):
         pass
 
+    # flat bet of 1, or with a bet spread, one unit per point of true count up to the spread
     @abstractmethod
     def get_bet_value(self):
-        return 1
+        if self.shoe is None or self.bet_spread <= 1:
+            return 1
+        return max(1, min(self.bet_spread, int(self.shoe.true_count())))
+
+    def watch_shoe(self, shoe):
+        self.shoe = shoe
+        if self.decision_engine is not None:
+            self.decision_engine.shoe = shoe
 
     def stage_action(self, dealer_card: Card):
         # there are a few things any player can do
@@ -175,63 +466,242 @@ class BasePlayer:
 
         # there is no default that a player should do,
         # but if the player gets blackjack or busts, they should just 'stay'
-        if self.hand.is_blackjack():
-            return PLAYER_POSSIBLE_ACTIONS.STAY
-        player_sum, _ = self.hand.sum()
-        if player_sum > 21:
-            return PLAYER_POSSIBLE_ACTIONS.STAY
+        if self.hand.is_blackjack() or self.hand.is_bust():
+            return ACTIONS.index('stay')
 
         # call upon the decision engine to take control here
         return self.decision_engine.stage_action(dealer_card, self.hand)
 
 
 class QPlayer(BasePlayer):
-    def __init__(self, name, initial_chip_count):
+    def __init__(self, name, initial_chip_count, file_format=PLAYER_FILE_FORMAT, file_prefix=PLAYER_FILE_PREFIX,
+                 rng: BatchedRng = None, learning: str = Q_LEARNING):
         super(QPlayer, self).__init__(name, initial_chip_count, is_dealer=False)
-        self.decision_engine = QDecisionEngine()
+        self.decision_engine = QDecisionEngine(rng, learning)
+        # 'json' keeps the readable player file, 'npz' saves the raw q table arrays,
+        # 'journal' appends every q update to a log that is folded into an npz snapshot now and then,
+        # 'store' plays straight out of an indexed sqlite file through an LRU cache
+        self.file_format = file_format
+        self.file_prefix = file_prefix
+        self.journal = QJournal(file_prefix, name) if file_format == 'journal' else None
+        # a ReplayBuffer to record every finished round into, off unless one is set
+        self.replay = None
+        if file_format == 'store':
+            self.decision_engine.states = QStore(self.as_filename(), default_vector=self.decision_engine.initial_vector())
 
     def load_from_file(self):
-        if os.path.exists(self.as_filename()):
+        # the store is already live, only the metadata needs reading
+        if self.file_format == 'store':
+            metadata = self.decision_engine.states.get_metadata()
+            self.score = {**self.score, **metadata.get('score', {})}
+            self.hands_seen = metadata.get('hands_seen', self.hands_seen)
+            self.chips = metadata.get('chips', self.chips)
+            self.restore_engine(metadata)
+        elif self.journal and self.journal.exists():
+            metadata = self.journal.recover(self.decision_engine.states)
+            self.score = {**self.score, **metadata.get('score', {})}
+            self.hands_seen = metadata.get('hands_seen', self.hands_seen)
+            self.chips = metadata.get('chips', self.chips)
+            self.restore_engine(metadata)
+        elif self.file_format == 'npz' and os.path.exists(self.as_filename()):
+            self.decision_engine.states, metadata = QTable.load(self.as_filename())
+            self.score = {**self.score, **metadata['score']}
+            self.hands_seen = metadata['hands_seen']
+            self.chips = metadata.get('chips', self.chips)
+            self.restore_engine(metadata)
+        elif os.path.exists(self.as_filename()):
             with open(self.as_filename(), 'r') as player_file:
-                self.decision_engine.states = json.loads(player_file.read() or '{}')
+                payload = json.loads(player_file.read() or '{}')
                 player_file.close()
 
-            if 'metadata' in self.decision_engine.states.keys():
-                self.score = self.decision_engine.states['metadata']['score']
-                self.hands_seen = self.decision_engine.states['metadata']['hands_seen']
+            if 'metadata' in payload.keys():
+                metadata = payload.pop('metadata')
+                self.score = {**self.score, **metadata['score']}
+                self.hands_seen = metadata['hands_seen']
+                self.chips = metadata.get('chips', self.chips)
+                self.restore_engine(metadata)
+
+            skipped = self.decision_engine.import_states(payload)
+            if skipped:
+                self.logger.warning(f'{skipped} states in {self.as_filename()} do not match the state encoding, skipped')
         else:
             self.logger.warning(f'File {self.as_filename()} did not exist, starting as fresh player')
 
+    # carries on the exploration schedule where the saved player left it
+    def restore_engine(self, metadata: dict):
+        engine_metadata = metadata.get('engine', {})
+        # files from before the learning modes were all trained with weights
+        learning = engine_metadata.get('learning', 'weights')
+        if engine_metadata and learning != self.decision_engine.learning:
+            self.logger.warning(f'{self.as_filename()} was trained with {learning} learning, '
+                                f'continuing it with {self.decision_engine.learning}')
+        self.decision_engine.episodes = engine_metadata.get('episodes', 0)
+
     def save_to_file(self):
+        self.saves += 1
+        # the updates are already on disk, only the metadata is rewritten,
+        # the journal is folded into a fresh snapshot once it grows past JOURNAL_COMPACTION_BYTES
+        if self.journal:
+            if self.journal.size() > JOURNAL_COMPACTION_BYTES:
+                self.journal.compact(self.decision_engine.states, self.get_metadata())
+            else:
+                self.journal.sync(self.get_metadata())
+            return
+
+        if self.file_format == 'store':
+            self.decision_engine.states.flush(self.get_metadata())
+            return
+
+        if self.file_format == 'npz':
+            self.decision_engine.states.save(self.as_filename(), self.get_metadata())
+            self.logger.info(f'saved {self.as_filename()}')
+            return
+
         with open(self.as_filename(), 'w+') as player_file:
-            payload = self.decision_engine.states.copy()
+            payload = self.decision_engine.export_states()
             payload['metadata'] = self.get_metadata()
             player_file.write(json.dumps(payload, sort_keys=True, indent=3))
             player_file.close()
         self.logger.info(f'saved {player_file.name}')
 
     def as_filename(self):
-        return f'{PLAYER_FILE_PREFIX}/{self.get_name()}.json'
+        if self.journal:
+            return self.journal.snapshot_path
+        if self.file_format == 'store':
+            return f'{self.file_prefix}/{self.get_name()}.db'
+        return f'{self.file_prefix}/{self.get_name()}.{self.file_format}'
+
+    # journal and store saves are incremental and cheap, the others rewrite the whole table
+    def saves_incrementally(self) -> bool:
+        return self.file_format in ('journal', 'store')
+
+    # detached copy of everything save_to_file writes, safe to save while this player keeps playing
+    def snapshot(self):
+        snapshot = QPlayer(self.name, self.chips, self.file_format, self.file_prefix,
+                           learning=self.decision_engine.learning)
+        snapshot.decision_engine.states = self.decision_engine.states.copy()
+        snapshot.decision_engine.episodes = self.decision_engine.episodes
+        snapshot.score = dict(self.score)
+        snapshot.hands_seen = self.hands_seen
+        return snapshot
 
     def get_bet_value(self):
         return super().get_bet_value()
 
     ### Below are QPlayer Specific Methods
 
+    def be_dealt(self, c1: Card, c2: Card):
+        super().be_dealt(c1, c2)
+        self.flush_last_states()
+
+    def last_action_good(self):
+        net = self.pending_chips
+        super().last_action_good()
+        # go through the other keys, and add that vector to the q vector
+        self.learn(net, GOOD_REWARD_VALUE)
+
+    def last_action_bad(self):
+        net = -self.pending_chips
+        super().last_action_bad()
+        self.learn(net, -BAD_REWARD_VALUE, floor=0)
+
+    def last_action_neutral(self):
+        super().last_action_neutral()
+        # nothing changes in the weights mode, but the journal still records the visits
+        self.learn(0, 0)
+
+    # net is the chips the round won or lost, backed up over the round by the td/mc modes;
+    # the weights mode adds weight_delta to every staged pair instead
+    def learn(self, net: int, weight_delta: float, floor=None):
+        engine = self.decision_engine
+        engine.episodes += 1
+        if engine.learning == 'weights':
+            states, actions = engine.last_state_actions()
+            deltas = engine.states.update(states, actions, weight_delta, floor=floor) if weight_delta \
+                else np.zeros(len(states))
+        else:
+            states, actions, deltas = engine.learn_episode(net)
+        if self.replay is not None:
+            self.replay.add_episode(states, actions, net)
+        self.journal_updates(states, actions, deltas)
+        self.flush_last_states()
+
+    def journal_updates(self, states, actions, deltas):
+        if self.journal and len(states):
+            self.journal.append(states, actions, deltas)
+
+    def flush_last_states(self):
+        self.decision_engine.last_states.clear()
+
 
 class NNPlayer(BasePlayer):
-    def __init__(self, name, initial_chip_count):
+    def __init__(self, name, initial_chip_count, file_prefix=PLAYER_FILE_PREFIX, rng: BatchedRng = None):
         super(NNPlayer, self).__init__(name, initial_chip_count, is_dealer=False)
-        self.decision_engine = NNDecisionEngine()
+        self.file_prefix = file_prefix
+        self.decision_engine = NNDecisionEngine(rng)
 
     def as_filename(self):
-        return f'{PLAYER_FILE_PREFIX}/{self.get_name()}.json'
+        return f'{self.file_prefix}/{self.get_name()}.nn.npz'
 
+    # network weights plus the same metadata the q players keep
     def load_from_file(self):
-        pass
+        if not os.path.exists(self.as_filename()):
+            self.logger.warning(f'File {self.as_filename()} did not exist, starting as fresh player')
+            return
+        with np.load(self.as_filename()) as data:
+            self.decision_engine.network.load_state_dict(data)
+            metadata = json.loads(str(data['metadata']))
+        self.score = {**self.score, **metadata['score']}
+        self.hands_seen = metadata['hands_seen']
+        self.chips = metadata.get('chips', self.chips)
+        self.decision_engine.train_steps = metadata['engine'].get('train_steps', 0)
 
     def save_to_file(self):
-        pass
+        self.saves += 1
+        np.savez(self.as_filename(), metadata=np.array(json.dumps(self.get_metadata())),
+                 **self.decision_engine.network.state_dict())
+        self.logger.info(f'saved {self.as_filename()}')
+
+    def be_dealt(self, c1: Card, c2: Card):
+        super().be_dealt(c1, c2)
+        self.decision_engine.last_decisions.clear()
+
+    def last_action_good(self):
+        super().last_action_good()
+        self.decision_engine.record_return(1)
+
+    def last_action_bad(self):
+        super().last_action_bad()
+        self.decision_engine.record_return(-1)
+
+    def last_action_neutral(self):
+        super().last_action_neutral()
+        self.decision_engine.record_return(0)
+
+    def get_bet_value(self):
+        return super().get_bet_value()
+
+class OptimalPlayer(BasePlayer):
+    # fixed reference player, nothing it learns needs saving; its file is the solved strategy table,
+    # read from there when it exists and only solved (and written there) the first time
+    def __init__(self, name, initial_chip_count, file_prefix=PLAYER_FILE_PREFIX, rng: BatchedRng = None,
+                 num_decks: int = NUM_DECKS):
+        super(OptimalPlayer, self).__init__(name, initial_chip_count, is_dealer=False)
+        self.file_prefix = file_prefix
+        self.num_decks = num_decks
+        os.makedirs(file_prefix, exist_ok=True)
+        self.decision_engine = OptimalDecisionEngine(rng, self.as_filename(), num_decks)
+
+    def as_filename(self):
+        return f'{self.file_prefix}/optimal_{self.num_decks}_decks.npz'
+
+    # the table was already read or solved when the player was made
+    def load_from_file(self):
+        self.decision_engine.shoe = self.shoe
+
+    def save_to_file(self):
+        self.saves += 1
+        save_strategy(self.as_filename(), self.decision_engine.values, self.decision_engine.num_decks)
 
     def get_bet_value(self):
         return super().get_bet_value()
@@ -258,17 +728,19 @@ class Dealer(BasePlayer):
         return self.hand.get(0) if self.hand else None
 
 
-def generate_player(name: str = ''):
+# generated players get their own child stream of rng for their decisions
+def generate_player(name: str = '', rng: BatchedRng = None):
+    rng = rng or BatchedRng()
     if name == '':
-        name = random.choice(PLAYER_NAME_CHOICES)
-    return QPlayer(name, 1000)
+        name = rng.choice(PLAYER_NAME_CHOICES)
+    return QPlayer(name, 1000, rng=rng.spawn(1)[0])
 
-def generate_players(num_players: int):
-    return [generate_player() for _ in range(num_players)]
+def generate_players(num_players: int, rng: BatchedRng = None):
+    return [generate_player(rng=rng) for _ in range(num_players)]
 
-def generate_dealer(name: str = ''):
+def generate_dealer(name: str = '', rng: BatchedRng = None):
     if name == '':
-        name = random.choice(DEALER_NAME_CHOICES)
+        name = (rng or BatchedRng()).choice(DEALER_NAME_CHOICES)
     return Dealer(name)
 
 ### Below this is the Old Player type         ###
@@ -312,7 +784,7 @@ def generate_dealer(name: str = ''):
 #         return {
 #             'chips': self.chips,
 #             'score': self.score,
-#             'num_states': len(self.states.keys()),
+#             'num_states': len(self.states),
 #             'hands_seen': self.hands_seen,
 #         }
 
@@ -1,35 +1,216 @@
 import json
+import os
+import shutil
+import tempfile
 
+import numpy as np
+
+from src import Player
+from src.constants import *
+from src.BlackjackTable import BlackjackTable
 from src.Card import Card
 from src.Deck import Deck
-from src.Player import Player, BaseDecisionEngine, QDecisionEngine
+from src.Hand import Hand
+from src.Player import QPlayer, BaseDecisionEngine, QDecisionEngine, OptimalDecisionEngine, OptimalPlayer, NNPlayer, nn_features
+from src.Rng import BatchedRng
+
 
 def test_player_q_action():
-    p1 = Player('danny', 1000)
+    p1 = QPlayer('danny', 1000)
     c1, c2, c3 = Card('spades', 1), Card('hearts', 5), Card('diamonds', 8)
     p1.be_dealt(c1, c2)
     print(p1)
-    print('action', p1.pick_and_stage_q_action(c3))
+    print('action', p1.stage_action(c3))
 
 
 def test_view_player_q_action_states():
-    p1 = Player('danny', 1000)
+    p1 = QPlayer('danny', 1000)
     d = Deck()
     d.shuffle()
 
     for i in range(1000):
         dealer_card = d.next()
         p1.be_dealt(d.next(), d.next())
-        p1.pick_and_stage_q_action(dealer_card)
+        p1.stage_action(dealer_card)
         p1.last_action_good()
 
-    print(json.dumps(p1.get_q_states(), indent=3))
+    print(json.dumps(p1.decision_engine.export_states(), indent=3))
+
 
 def test_player_init():
     de = QDecisionEngine()
     print(de)
 
 
+def test_state_key():
+    de = QDecisionEngine()
+    h = Hand([Card('spades', 9), Card('hearts', 9)])
+    key = de.generate_state_key(Card('clubs', 9), h)
+    assert isinstance(key, int)
+    assert de.encoder.describe(key) == "9-[['9', '9']]"
+
+
+def test_npz_player_file():
+    p1 = QPlayer('danny', 1000, file_format='npz')
+    with tempfile.TemporaryDirectory() as tmp:
+        p1.as_filename = lambda: os.path.join(tmp, 'danny.npz')
+        p1.be_dealt(Card('spades', 5), Card('hearts', 7))
+        p1.stage_action(Card('clubs', 9))
+        p1.last_action_good()
+        p1.save_to_file()
+
+        p2 = QPlayer('danny', 1000, file_format='npz')
+        p2.as_filename = p1.as_filename
+        p2.load_from_file()
+    assert p2.hands_seen == 1
+    assert np.array_equal(p2.decision_engine.states.values, p1.decision_engine.states.values)
+
+
+def test_journal_player_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        p1 = QPlayer('danny', 1000, file_format='journal', file_prefix=tmp)
+        d = Deck()
+        d.shuffle()
+        for i in range(200):
+            dealer_card = d.next()
+            p1.be_dealt(d.next(), d.next())
+            p1.stage_action(dealer_card)
+            [p1.last_action_good, p1.last_action_bad, p1.last_action_neutral][i % 3]()
+        p1.save_to_file()
+        p1.journal.close()
+
+        p2 = QPlayer('danny', 1000, file_format='journal', file_prefix=tmp)
+        p2.load_from_file()
+        p2.journal.close()
+    assert p2.hands_seen == 200
+    assert np.array_equal(p2.decision_engine.states.values, p1.decision_engine.states.values)
+    assert np.array_equal(p2.decision_engine.states.visits, p1.decision_engine.states.visits)
+
+
+def test_player_file_without_draws():
+    # files saved before pushes were counted have no draws in their score
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copy(os.path.join(PLAYER_FILE_PREFIX, 'test_danny.json'), tmp)
+        p = QPlayer('test_danny', 1000, file_format='json', file_prefix=tmp, rng=BatchedRng(5))
+        p.load_from_file()
+        assert p.score['draws'] == 0 and p.score['wins'] > 0
+        table = BlackjackTable(0, rng=BatchedRng(6))
+        table.add_player(p)
+        for _ in range(200):
+            table.complete_a_round()
+    assert p.score['draws'] > 0
+
+
+def test_store_player_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        p1 = QPlayer('danny', 1000, file_format='store', file_prefix=tmp)
+        p1.be_dealt(Card('spades', 5), Card('hearts', 7))
+        key = p1.decision_engine.generate_state_key(Card('clubs', 9), p1.get_hand())
+        action = p1.stage_action(Card('clubs', 9))
+        p1.last_action_good()
+        p1.save_to_file()
+        p1.decision_engine.states.close()
+
+        p2 = QPlayer('danny', 1000, file_format='store', file_prefix=tmp)
+        p2.load_from_file()
+        assert p2.hands_seen == 1
+        assert p2.decision_engine.states[key][action] == DEFAULT_VECTOR[action] + GOOD_REWARD_VALUE
+        p2.decision_engine.states.close()
+
+
+def test_optimal_engine():
+    with tempfile.TemporaryDirectory() as tmp:
+        player = OptimalPlayer('optimal', 1000, file_prefix=tmp)
+        engine = player.decision_engine
+        ten, six = Card('clubs', 10), Card('clubs', 6)
+        # hard 16 hits a ten and stands on a six, everything stands on 17
+        assert ACTIONS[engine.stage_action(ten, Hand([Card('spades', 10), Card('hearts', 6)]))] == 'hit'
+        assert ACTIONS[engine.stage_action(six, Hand([Card('spades', 10), Card('hearts', 6)]))] == 'stay'
+        assert ACTIONS[engine.stage_action(ten, Hand([Card('spades', 10), Card('hearts', 7)]))] == 'stay'
+        # illegal actions are never worth anything
+        values = engine.action_values(six, Hand([Card('spades', 10), Card('hearts', 4), Card('hearts', 2)]))
+        assert values[ACTIONS.index('double')] == -np.inf and values[ACTIONS.index('split')] == -np.inf
+
+        # the solved table is written once and read back instead of solved again
+        assert os.path.exists(player.as_filename())
+        solve_strategy = Player.solve_strategy
+        Player.solve_strategy = None
+        try:
+            reloaded = OptimalPlayer('optimal', 1000, file_prefix=tmp)
+        finally:
+            Player.solve_strategy = solve_strategy
+        reloaded.load_from_file()
+        assert reloaded.decision_engine.actions == engine.actions
+        player.save_to_file()
+        assert player.saves == 1
+
+
+def test_nn_player():
+    with tempfile.TemporaryDirectory() as tmp:
+        player = NNPlayer('net', 1000, file_prefix=tmp)
+        engine = player.decision_engine
+        # one forward pass for a batch of hands, illegal actions are never picked
+        features = nn_features([10, 6, 1], [16, 12, 20], [False, False, True], [False, True, False], [True, True, False])
+        assert engine.action_values(features).shape == (3, len(ACTIONS))
+        actions = engine.best_actions(features, np.array([0, 3, 0]))
+        assert actions[0] in (0, 1) and actions[2] in (0, 1)
+
+        # every decision of a round is trained on the round's return once a batch has built up
+        player.be_dealt(Card('spades', 10), Card('hearts', 6))
+        for _ in range(NN_TRAIN_BATCH_SIZE):
+            player.stage_bet()
+            player.stage_action(Card('clubs', 9))
+            player.last_action_bad()
+        assert engine.train_steps == 1 and engine.last_loss is not None
+
+        player.save_to_file()
+        loaded = NNPlayer('net', 0, file_prefix=tmp)
+        loaded.load_from_file()
+        assert loaded.score == player.score and loaded.decision_engine.train_steps == 1
+        assert np.allclose(loaded.decision_engine.action_values(features), engine.action_values(features))
+
+
+def test_td_and_mc_backups():
+    hands = [Hand([Card('spades', 10), Card('hearts', 2)]), Hand([Card('spades', 10), Card('hearts', 2), Card('clubs', 3)])]
+    for learning, expected in (('mc', [0.5 * 0.9 * 2, 0.5 * 2]), ('td', [0.5 * 0.9 * 1.0, 0.5 * 2])):
+        engine = QDecisionEngine(learning=learning, learning_rate=0.5, discount=0.9)
+        first, second = (engine.generate_state_key(Card('clubs', 6), h) for h in hands)
+        # the hand after the hit is worth 1 standing, 4 doubling, but only hit and stay are open to it
+        engine.states.values[second] = [-1.0, 1.0, 0.0, 4.0]
+        engine.last_states = {first: ACTIONS.index('hit'), second: ACTIONS.index('stay')}
+        states, actions, deltas = engine.learn_episode(2)
+        assert states.tolist() == [first, second]
+        assert np.allclose(deltas, [expected[0], 0.5 * (2 - 1.0)])
+        assert np.isclose(engine.states[first][ACTIONS.index('hit')], expected[0])
+
+    # td/mc players keep expected returns, so values can go below 0 and the exploration schedule advances per round
+    table = BlackjackTable(0, rng=BatchedRng(5))
+    player = QPlayer('tim', 1000, rng=BatchedRng(6), learning='td')
+    table.add_player(player)
+    for _ in range(300):
+        table.complete_a_round()
+    engine = player.decision_engine
+    assert engine.episodes == 300
+    assert engine.epsilon() < Q_EPSILON_START
+    assert engine.states.values.min() < 0
+    assert player.get_metadata()['engine']['learning'] == 'td'
+
+
+def test_batched_stage_actions():
+    hands = [Hand([Card('spades', a), Card('hearts', b)]) for a in range(1, 11) for b in range(a, 11)]
+    upcards = [(i % 10) + 1 for i in range(len(hands))]
+    legal = [h.can_split() | h.can_double() << 1 for h in hands]
+
+    # one batched call takes the same decisions as asking hand by hand with the same random stream
+    for make in (lambda: QDecisionEngine(BatchedRng(4)), lambda: QDecisionEngine(BatchedRng(4), learning='td'),
+                 lambda: OptimalDecisionEngine(BatchedRng(4))):
+        single, batched = make(), make()
+        one_by_one = [single.stage_action(Card('clubs', u), h) for u, h in zip(upcards, hands)]
+        actions = batched.stage_actions(upcards, [h.composition_id for h in hands], legal)
+        assert actions.tolist() == one_by_one
+        assert batched.stage_actions([], [], []).tolist() == []
+
+
 if __name__ == '__main__':
     # test_player_q_action()
-    test_player_init()
\ No newline at end of file
+    test_player_init()
@@ -0,0 +1,145 @@
+import glob
+import json
+import os
+import threading
+
+import numpy as np
+
+from src.constants import *
+from src.QTable import QTable
+
+# one packed 13 byte record per applied q update, a delta of 0 still counts as a visit
+# deltas are float64 so td and mc tables replay to exactly the values they were saved with
+JOURNAL_RECORD = np.dtype([('state', '<u4'), ('action', 'u1'), ('delta', '<f8')])
+
+
+class QJournal:
+    # append-only persistence for a QTable
+    #   {name}.npz             snapshot, includes every segment older than its journal_generation
+    #   {name}.{gen}.journal   segments of JOURNAL_RECORDs, replayed on top of the snapshot
+    #   {name}.meta.json       player metadata as of the last sync
+    # compaction rotates to a new segment and folds the old ones into a new snapshot on a background thread
+    def __init__(self, prefix: str, name: str) -> None:
+        self.prefix = prefix
+        self.name = name
+        self.snapshot_path = f'{prefix}/{name}.npz'
+        self.metadata_path = f'{prefix}/{name}.meta.json'
+        self.generation = 0
+        self.file = None
+        self.compaction = None
+
+    def segment_path(self, generation: int) -> str:
+        return f'{self.prefix}/{self.name}.{generation}.journal'
+
+    def segment_generations(self):
+        generations = []
+        for path in glob.glob(f'{glob.escape(self.prefix)}/{glob.escape(self.name)}.*.journal'):
+            generation = path[:-len('.journal')].rsplit('.', 1)[-1]
+            if generation.isdigit():
+                generations.append(int(generation))
+        return sorted(generations)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.snapshot_path) or bool(self.segment_generations())
+
+    # loads the snapshot into table, replays the newer segments and returns the saved metadata
+    def recover(self, table: QTable) -> dict:
+        metadata = {}
+        if os.path.exists(self.snapshot_path):
+            snapshot, metadata = QTable.load(self.snapshot_path)
+            table.assign(snapshot.values, snapshot.visits)
+        self.generation = metadata.get('journal_generation', 0)
+
+        for generation in self.segment_generations():
+            if generation >= self.generation:
+                records = np.fromfile(self.segment_path(generation), dtype=JOURNAL_RECORD)
+                self.replay(table, records)
+                self.generation = generation
+
+        if os.path.exists(self.metadata_path):
+            with open(self.metadata_path, 'r') as metadata_file:
+                metadata = json.load(metadata_file)
+        self.file = open(self.segment_path(self.generation), 'ab')
+        return metadata
+
+    @staticmethod
+    def replay(table: QTable, records: np.ndarray):
+        states = records['state'].astype(np.int64)
+        np.add.at(table.values, (states, records['action'].astype(np.int64)), records['delta'].astype(np.float64))
+        np.add.at(table.visits, states, 1)
+        table.invalidate(states)
+
+    def _open(self):
+        # a journal that was never recovered starts over, same as overwriting a player file
+        for generation in self.segment_generations():
+            os.remove(self.segment_path(generation))
+        for path in (self.snapshot_path, self.metadata_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.generation = 0
+        self.file = open(self.segment_path(self.generation), 'ab')
+
+    def append(self, states: np.ndarray, actions: np.ndarray, deltas: np.ndarray):
+        if self.file is None:
+            self._open()
+        records = np.empty(len(states), dtype=JOURNAL_RECORD)
+        records['state'] = states
+        records['action'] = actions
+        records['delta'] = deltas
+        self.file.write(records.tobytes())
+
+    def size(self) -> int:
+        return self.file.tell() if self.file else 0
+
+    # makes everything appended so far durable, along with the latest player metadata
+    def sync(self, metadata: dict):
+        if self.file is None:
+            self._open()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self._write_atomic(self.metadata_path, lambda path: self._write_json(path, metadata))
+
+    def compact(self, table: QTable, metadata: dict):
+        self.wait()
+        self.sync(metadata)
+
+        # everything up to here goes into the snapshot, new records go into the next segment
+        self.file.close()
+        self.generation += 1
+        self.file = open(self.segment_path(self.generation), 'ab')
+        snapshot = table.copy()
+        metadata = dict(metadata, journal_generation=self.generation)
+
+        self.compaction = threading.Thread(target=self._fold, args=(snapshot, metadata, self.generation))
+        self.compaction.start()
+
+    def _fold(self, snapshot: QTable, metadata: dict, generation: int):
+        self._write_atomic(self.snapshot_path, lambda path: snapshot.save(path, metadata))
+        # the snapshot is in place, older segments are no longer needed
+        for old in self.segment_generations():
+            if old < generation:
+                os.remove(self.segment_path(old))
+
+    @staticmethod
+    def _write_json(path: str, payload: dict):
+        with open(path, 'w') as json_file:
+            json.dump(payload, json_file)
+
+    @staticmethod
+    def _write_atomic(path: str, write):
+        # keep the extension last, np.savez would append .npz otherwise
+        root, ext = os.path.splitext(path)
+        tmp_path = f'{root}.tmp{ext}'
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+    def wait(self):
+        if self.compaction is not None:
+            self.compaction.join()
+            self.compaction = None
+
+    def close(self):
+        self.wait()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,66 @@
+import os
+import tempfile
+
+import numpy as np
+
+from src.constants import *
+from src.BlackjackTable import BlackjackTable
+from src.Player import QPlayer
+from src.QJournal import QJournal
+from src.QTable import QTable
+from src.Rng import BatchedRng
+
+def test_recover_replays_journal():
+    with tempfile.TemporaryDirectory() as tmp:
+        table = QTable(20)
+        journal = QJournal(tmp, 'danny')
+        journal.append(np.array([3, 4]), np.array([0, 1]), np.array([9.0, -1.0]))
+        journal.append(np.array([3]), np.array([0]), np.array([0.0]))
+        journal.sync({'hands_seen': 2})
+        journal.close()
+
+        recovered = QTable(20)
+        metadata = QJournal(tmp, 'danny').recover(recovered)
+        assert metadata['hands_seen'] == 2
+        assert recovered[3].tolist() == [10, 1, 1, 1]
+        assert recovered[4].tolist() == [1, 0, 1, 1]
+        assert recovered.visits[3] == 2 and recovered.visits[4] == 1
+
+def test_compaction():
+    with tempfile.TemporaryDirectory() as tmp:
+        table = QTable(20)
+        journal = QJournal(tmp, 'danny')
+        table.update(np.array([1]), np.array([1]), 5)
+        journal.append(np.array([1]), np.array([1]), np.array([5.0]))
+        journal.compact(table, {'hands_seen': 1})
+
+        # updates after the rotation land in the next segment
+        table.update(np.array([2]), np.array([0]), 3)
+        journal.append(np.array([2]), np.array([0]), np.array([3.0]))
+        journal.sync({'hands_seen': 2})
+        journal.close()
+
+        assert os.path.exists(journal.snapshot_path)
+        assert journal.segment_generations() == [1]
+
+        recovered = QTable(20)
+        metadata = QJournal(tmp, 'danny').recover(recovered)
+        assert metadata['hands_seen'] == 2
+        assert np.array_equal(recovered.values, table.values)
+
+def test_td_player_recovers_exactly():
+    # td and mc deltas are full float64 steps, the journal keeps every bit of them
+    with tempfile.TemporaryDirectory() as tmp:
+        table = BlackjackTable(0, rng=BatchedRng(7))
+        p1 = QPlayer('danny', 1000, file_format='journal', file_prefix=tmp, rng=BatchedRng(8), learning='td')
+        table.add_player(p1)
+        for _ in range(300):
+            table.complete_a_round()
+        p1.save_to_file()
+        p1.journal.close()
+
+        p2 = QPlayer('danny', 1000, file_format='journal', file_prefix=tmp, learning='td')
+        p2.load_from_file()
+        p2.journal.close()
+    assert np.array_equal(p2.decision_engine.states.values, p1.decision_engine.states.values)
+    assert np.array_equal(p2.decision_engine.states.visits, p1.decision_engine.states.visits)
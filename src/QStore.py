@@ -0,0 +1,121 @@
+import json
+from bisect import bisect_right
+import sqlite3
+from collections import OrderedDict
+
+import numpy as np
+
+from src.constants import *
+from src.QTable import build_samplers
+
+class QStore:
+    # q table kept in an indexed sqlite file instead of memory, for state spaces too large for a dense QTable
+    # rows are read through a bounded LRU cache, changed rows are written back when evicted or flushed
+    # state ids can be any integer, so finer state keys don't need a bigger preallocated table
+    def __init__(self, path: str, cache_size: int = Q_STORE_CACHE_SIZE, default_vector=DEFAULT_VECTOR) -> None:
+        self.path = path
+        self.cache_size = cache_size
+        self.default_vector = list(default_vector)
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS q_states (state INTEGER PRIMARY KEY, q_values BLOB, visits INTEGER)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT)')
+        self.db.commit()
+
+        # state -> [values, visits, dirty, samplers]
+        self.cache = OrderedDict()
+        self.num_known = self.db.execute('SELECT COUNT(*) FROM q_states WHERE visits > 0').fetchone()[0]
+
+    def __len__(self) -> int:
+        return self.num_known
+
+    def __contains__(self, state: int) -> bool:
+        return self._entry(state)[1] > 0
+
+    def __getitem__(self, state: int) -> np.ndarray:
+        return self._entry(state)[0]
+
+    def _entry(self, state: int):
+        state = int(state)
+        entry = self.cache.get(state)
+        if entry is not None:
+            self.cache.move_to_end(state)
+            return entry
+
+        row = self.db.execute('SELECT q_values, visits FROM q_states WHERE state = ?', (state,)).fetchone()
+        if row is None:
+            entry = [np.array(self.default_vector, dtype=np.float64), 0, False, None]
+        else:
+            entry = [np.frombuffer(row[0], dtype=np.float64).copy(), row[1], False, None]
+        self.cache[state] = entry
+
+        if len(self.cache) > self.cache_size:
+            evicted_state, evicted = self.cache.popitem(last=False)
+            if evicted[2]:
+                self._write([(evicted_state, evicted)])
+        return entry
+
+    def _write(self, items):
+        self.db.executemany('INSERT OR REPLACE INTO q_states (state, q_values, visits) VALUES (?, ?, ?)',
+                            [(state, entry[0].tobytes(), entry[1]) for state, entry in items])
+
+    def visit(self, state: int):
+        entry = self._entry(state)
+        if entry[1] == 0:
+            self.num_known += 1
+        entry[1] += 1
+        entry[2] = True
+
+    # same contract as QTable.rows
+    def rows(self, states) -> np.ndarray:
+        return np.array([self._entry(s)[0] for s in states]).reshape(len(states), len(self.default_vector))
+
+    # same contract as QTable.sample, the samplers live and die with the cache entry
+    def sample(self, state: int, legal: int, shot: float) -> int:
+        entry = self._entry(state)
+        if entry[3] is None:
+            entry[3] = build_samplers(entry[0])
+        total, cumulative = entry[3][legal]
+        return bisect_right(cumulative, shot * total)
+
+    def sample_many(self, states, legal, shots) -> np.ndarray:
+        return np.array([self.sample(s, l, shot) for s, l, shot in zip(states, legal, shots)], dtype=np.int64)
+
+    # same contract as QTable.update
+    def update(self, states, actions, deltas, floor=None):
+        deltas = np.broadcast_to(deltas, np.shape(states))
+        applied = np.zeros(len(states))
+        for i, (state, action, delta) in enumerate(zip(states, actions, deltas)):
+            entry = self._entry(state)
+            before = entry[0][action]
+            after = before + delta
+            if floor is not None:
+                after = max(after, floor)
+            entry[0][action] = after
+            entry[2] = True
+            entry[3] = None
+            applied[i] = after - before
+        return applied
+
+    def known_states(self) -> np.ndarray:
+        self.flush()
+        rows = self.db.execute('SELECT state FROM q_states WHERE visits > 0 ORDER BY state').fetchall()
+        return np.array([row[0] for row in rows], dtype=np.int64)
+
+    def get_metadata(self) -> dict:
+        row = self.db.execute("SELECT value FROM metadata WHERE key = 'player'").fetchone()
+        return json.loads(row[0]) if row else {}
+
+    # writes every changed row (and optionally the player metadata) and commits
+    def flush(self, metadata: dict = None):
+        dirty = [(state, entry) for state, entry in self.cache.items() if entry[2]]
+        self._write(dirty)
+        for _, entry in dirty:
+            entry[2] = False
+        if metadata is not None:
+            self.db.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES ('player', ?)", (json.dumps(metadata),))
+        self.db.commit()
+
+    def close(self):
+        self.flush()
+        self.db.close()
@@ -0,0 +1,38 @@
+import os
+import tempfile
+
+import numpy as np
+
+from src.constants import *
+from src.QStore import QStore
+
+def test_eviction_writes_back():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = QStore(os.path.join(tmp, 'danny.db'), cache_size=4)
+        for state in range(10):
+            store.visit(state * 1000)
+            store.update(np.array([state * 1000]), np.array([0]), state)
+        assert len(store.cache) == 4
+        assert len(store) == 10
+
+        # evicted rows come back from disk with their updates
+        assert store[0][0] == DEFAULT_VECTOR[0]
+        assert store[5000][0] == DEFAULT_VECTOR[0] + 5
+        assert 3000 in store and 3001 not in store
+        store.close()
+
+def test_reopen():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'danny.db')
+        store = QStore(path)
+        store.visit(7)
+        applied = store.update(np.array([7, 7]), np.array([1, 1]), -BAD_REWARD_VALUE, floor=0)
+        assert applied.tolist() == [-1, 0]
+        store.flush({'hands_seen': 3})
+        store.close()
+
+        reopened = QStore(path)
+        assert reopened.get_metadata() == {'hands_seen': 3}
+        assert reopened[7].tolist() == [1, 0, 1, 1]
+        assert reopened.known_states().tolist() == [7]
+        reopened.close()
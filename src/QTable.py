@@ -0,0 +1,163 @@
+import json
+from bisect import bisect_right
+
+import numpy as np
+
+from src.constants import *
+
+# weights of the legal actions, indexed by can_split | can_double << 1; hit and stay are always legal
+LEGAL_ACTION_MASKS = np.array([[1, 1, can_split, can_double] for can_double in (0, 1) for can_split in (0, 1)],
+                              dtype=np.float64)
+# every legal weight was punished down to 0, fall back to a coin flip between hit and stay
+FALLBACK_WEIGHTS = [1, 1, 0, 0]
+# sample_many batches below this many rows loop over the cached samplers instead of vectorizing
+SAMPLE_MANY_VECTORIZED_ROWS = 32
+
+
+# cumulative weights for bisect sampling, one list per legal action mask
+# the bounds from the last legal action on are infinite so float rounding on the shot can never land past it
+def build_samplers(vector) -> list:
+    samplers = []
+    for mask in LEGAL_ACTION_MASKS:
+        weights = (vector * mask).tolist()
+        if sum(weights) <= 0:
+            weights = FALLBACK_WEIGHTS
+        cumulative = np.cumsum(weights).tolist()
+        total = cumulative[-1]
+        last = max(i for i, weight in enumerate(weights) if weight > 0)
+        cumulative[last:] = [float('inf')] * (len(cumulative) - last)
+        samplers.append((total, cumulative))
+    return samplers
+
+
+class QTable:
+    # one contiguous (num_states, num_actions) row per encoder state id, with a visit count per state
+    # a state counts as known once it has been visited (or loaded)
+    def __init__(self, num_states: int, num_actions: int = len(ACTIONS), default_vector=DEFAULT_VECTOR) -> None:
+        self.default_vector = np.array(default_vector, dtype=np.float64)
+        self.values = np.tile(self.default_vector, (num_states, 1))
+        self.visits = np.zeros(num_states, dtype=np.int64)
+        # state -> cached samplers, rebuilt only after that state's weights change
+        self.samplers = {}
+        assert self.values.shape == (num_states, num_actions)
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.visits))
+
+    def __contains__(self, state: int) -> bool:
+        return self.visits[state] > 0
+
+    def __getitem__(self, state: int) -> np.ndarray:
+        return self.values[state]
+
+    def num_states(self) -> int:
+        return self.values.shape[0]
+
+    def visit(self, state: int):
+        self.visits[state] += 1
+
+    def known_states(self) -> np.ndarray:
+        return np.flatnonzero(self.visits)
+
+    # copy of the rows of many states at once
+    def rows(self, states) -> np.ndarray:
+        return self.values[states]
+
+    # action index sampled in proportion to the state's weights, restricted to the legal actions
+    # constant time once the state's samplers are cached
+    def sample(self, state: int, legal: int, shot: float) -> int:
+        samplers = self.samplers.get(state)
+        if samplers is None:
+            samplers = self.samplers[state] = build_samplers(self.values[state])
+        total, cumulative = samplers[legal]
+        return bisect_right(cumulative, shot * total)
+
+    # sample for many (state, legal, shot) rows; small batches go through the cached samplers,
+    # larger ones are worth one vectorized pass over the rows
+    def sample_many(self, states, legal, shots) -> np.ndarray:
+        if len(states) < SAMPLE_MANY_VECTORIZED_ROWS:
+            return np.array([self.sample(s, l, shot) for s, l, shot in zip(states, legal, shots)], dtype=np.int64)
+
+        weights = self.values[states] * LEGAL_ACTION_MASKS[legal]
+        exhausted = weights.sum(axis=1) <= 0
+        weights[exhausted] = FALLBACK_WEIGHTS
+        cumulative = np.cumsum(weights, axis=1)
+        actions = np.sum(np.asarray(shots)[:, None] * cumulative[:, -1:] >= cumulative, axis=1)
+        # float rounding can push a shot past the last bound, same guard as build_samplers
+        last = len(ACTIONS) - 1 - np.argmax(weights[:, ::-1] > 0, axis=1)
+        return np.minimum(actions, last)
+
+    # writes to values outside of update/merge must drop the cached samplers of the states they touch
+    def invalidate(self, states=None):
+        if states is None:
+            self.samplers.clear()
+        else:
+            for state in np.unique(states).tolist():
+                self.samplers.pop(state, None)
+
+    # add deltas to (state, action) pairs, repeated pairs accumulate
+    # with a floor, the touched values are clamped from below afterwards
+    # returns the change each entry contributed, so replaying them with np.add.at gives the same values;
+    # a repeated pair the floor clamped has its whole change on its first entry and 0 on the others
+    def update(self, states, actions, deltas, floor=None):
+        deltas = np.broadcast_to(np.asarray(deltas, dtype=np.float64), np.shape(states))
+        if floor is None:
+            np.add.at(self.values, (states, actions), deltas)
+            self.invalidate(states)
+            return deltas.copy()
+
+        before = self.values[states, actions]
+        np.add.at(self.values, (states, actions), deltas)
+        after = np.maximum(self.values[states, actions], floor)
+        self.values[states, actions] = after
+        self.invalidate(states)
+        _, first = np.unique(np.asarray(states) * self.values.shape[1] + np.asarray(actions), return_index=True)
+        applied = np.zeros(len(after))
+        applied[first] = (after - before)[first]
+        return applied
+
+    def policy(self) -> np.ndarray:
+        return np.argmax(self.values, axis=1)
+
+    def copy(self):
+        table = QTable.__new__(QTable)
+        table.default_vector = self.default_vector.copy()
+        table.values = self.values.copy()
+        table.visits = self.visits.copy()
+        table.samplers = {}
+        return table
+
+    # (value delta, visit delta) of this table relative to an older copy of it
+    def diff(self, other):
+        return self.values - other.values, self.visits - other.visits
+
+    # with a floor, every value is clamped from below afterwards
+    def merge(self, value_deltas: np.ndarray, visit_deltas: np.ndarray, floor=None):
+        self.values += value_deltas
+        self.visits += visit_deltas
+        if floor is not None:
+            np.maximum(self.values, floor, out=self.values)
+        self.invalidate()
+
+    # replace the whole table, e.g. with a broadcast master copy
+    def assign(self, values: np.ndarray, visits: np.ndarray):
+        self.values[:] = values
+        self.visits[:] = visits
+        self.invalidate()
+
+    def save(self, path: str, metadata: dict = None):
+        np.savez(path, values=self.values, visits=self.visits, default_vector=self.default_vector,
+                 metadata=np.array(json.dumps(metadata or {})))
+
+    # files saved before the default vector was stored get DEFAULT_VECTOR
+    @staticmethod
+    def load(path: str):
+        with np.load(path) as data:
+            table = QTable.__new__(QTable)
+            table.default_vector = np.array(data['default_vector'] if 'default_vector' in data.files else DEFAULT_VECTOR,
+                                            dtype=np.float64)
+            table.values = data['values']
+            table.visits = data['visits']
+            table.samplers = {}
+            metadata = json.loads(str(data['metadata']))
+        return table, metadata
@@ -0,0 +1,84 @@
+import os
+import tempfile
+
+import numpy as np
+
+from src.constants import *
+from src.QTable import QTable
+
+def test_rows_are_independent():
+    table = QTable(10)
+    table.update(np.array([3]), np.array([0]), GOOD_REWARD_VALUE)
+    assert table[3][0] == DEFAULT_VECTOR[0] + GOOD_REWARD_VALUE
+    # the other rows keep their own default vector
+    assert table[4].tolist() == DEFAULT_VECTOR
+
+def test_update_with_floor():
+    table = QTable(10)
+    table.update(np.array([1, 1, 2]), np.array([0, 1, 1]), -BAD_REWARD_VALUE, floor=0)
+    assert table[1].tolist() == [0, 0, 1, 1]
+    assert table[2].tolist() == [1, 0, 1, 1]
+
+    # repeated pairs report what each entry added, so replaying the returned deltas rebuilds the table
+    for floor in (None, 0):
+        table, replayed = QTable(10), QTable(10)
+        states, actions = np.array([3, 3, 3, 4]), np.array([1, 1, 1, 0])
+        applied = table.update(states, actions, np.array([-0.5, -0.25, 2.0, -3.0]), floor=floor)
+        np.add.at(replayed.values, (states, actions), applied)
+        assert np.array_equal(replayed.values, table.values)
+
+def test_policy_and_merge():
+    table = QTable(4)
+    before = table.copy()
+    table.update(np.array([0, 1, 2, 3]), np.array([0, 1, 2, 3]), 5)
+    table.visit(2)
+    assert table.policy().tolist() == [0, 1, 2, 3]
+    assert len(table) == 1 and 2 in table
+
+    value_deltas, visit_deltas = table.diff(before)
+    before.merge(value_deltas, visit_deltas)
+    assert np.array_equal(before.values, table.values)
+    assert np.array_equal(before.visits, table.visits)
+
+def test_save_and_load():
+    table = QTable(6)
+    table.visit(5)
+    table.update(np.array([5]), np.array([1]), 2.5)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'table.npz')
+        table.save(path, {'hands_seen': 7})
+        loaded, metadata = QTable.load(path)
+    assert metadata['hands_seen'] == 7
+    assert np.array_equal(loaded.values, table.values)
+    assert loaded.visits[5] == 1
+    assert np.array_equal(loaded.default_vector, table.default_vector)
+
+    # td and mc tables start from zeros, loading one keeps that
+    zeros = QTable(2, default_vector=np.zeros(len(ACTIONS)))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'zeros.npz')
+        zeros.save(path)
+        loaded, _ = QTable.load(path)
+    assert not loaded.default_vector.any()
+
+def test_sample_respects_legal_actions():
+    table = QTable(2)
+    # no split or double: only hit and stay can come out, the row is not touched
+    assert {table.sample(0, 0, shot) for shot in np.linspace(0, 0.999999, 50)} == {0, 1}
+    assert {table.sample(0, 3, shot) for shot in np.linspace(0, 0.999999, 50)} == {0, 1, 2, 3}
+    assert table[0].tolist() == DEFAULT_VECTOR
+    # a shot rounded up to the total still lands on a legal action
+    assert table.sample(0, 0, 1.0) == 1
+
+def test_sample_cache_follows_updates():
+    table = QTable(2)
+    assert table.sample(1, 0, 0.25) == 0
+    # all of hit's weight punished away, the cached samplers must not keep picking it
+    table.update(np.array([1]), np.array([0]), -BAD_REWARD_VALUE, floor=0)
+    assert table.sample(1, 0, 0.0) == 1
+    # nothing legal left with weight, fall back to a coin flip between hit and stay
+    table.update(np.array([1]), np.array([1]), -BAD_REWARD_VALUE, floor=0)
+    assert table.sample(1, 0, 0.25) == 0 and table.sample(1, 0, 0.75) == 1
+
+    table.assign(np.full((2, 4), [0, 0, 0, 1.0]), table.visits)
+    assert table.sample(1, 2, 0.5) == 3
@@ -0,0 +1,129 @@
+import json
+import os
+from typing import NamedTuple
+
+import numpy as np
+
+from src.constants import *
+from src.Rng import BatchedRng
+
+FIELDS = ['states', 'actions', 'rewards', 'next_states', 'dones', 'priorities']
+
+
+class ReplayBatch(NamedTuple):
+    indices: np.ndarray
+    states: np.ndarray
+    actions: np.ndarray
+    rewards: np.ndarray
+    next_states: np.ndarray
+    dones: np.ndarray
+    # importance sampling weights, all 1 for uniform batches
+    weights: np.ndarray
+
+
+class ReplayBuffer:
+    # fixed capacity ring of (state id, action, reward, next state id, done) transitions in preallocated arrays,
+    # so memory never grows past capacity and an insert writes one slot, overwriting the oldest once full
+    # next_state is -1 on the step that ended the round
+    # each transition also has a sampling priority, new ones get the largest priority seen so far
+    # so they are sampled at least once before their error is known
+    def __init__(self, capacity: int = REPLAY_CAPACITY) -> None:
+        self.capacity = capacity
+        self.states = np.zeros(capacity, dtype=np.int64)
+        self.actions = np.zeros(capacity, dtype=np.int8)
+        self.rewards = np.zeros(capacity, dtype=np.float64)
+        self.next_states = np.full(capacity, -1, dtype=np.int64)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.priorities = np.zeros(capacity, dtype=np.float64)
+        # next slot written, and how many slots hold a transition
+        self.position = 0
+        self.size = 0
+        self.max_priority = 1.0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, state: int, action: int, reward: float, next_state: int, done: bool):
+        i = self.position
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        self.priorities[i] = self.max_priority
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    # add for arrays of transitions, wrapping around the end of the ring
+    def extend(self, states, actions, rewards, next_states, dones):
+        n = len(states)
+        keep = slice(max(0, n - self.capacity), n)
+        slots = (self.position + np.arange(n)[keep]) % self.capacity
+        self.states[slots] = np.asarray(states)[keep]
+        self.actions[slots] = np.asarray(actions)[keep]
+        self.rewards[slots] = np.broadcast_to(rewards, (n,))[keep]
+        self.next_states[slots] = np.asarray(next_states)[keep]
+        self.dones[slots] = np.broadcast_to(dones, (n,))[keep]
+        self.priorities[slots] = self.max_priority
+        self.position = (self.position + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    # the steps of one round in the order they were taken, the reward is paid on the last one
+    def add_episode(self, states, actions, reward: float):
+        n = len(states)
+        if not n:
+            return
+        rewards = np.zeros(n)
+        rewards[-1] = reward
+        next_states = np.append(np.asarray(states)[1:], -1)
+        self.extend(states, actions, rewards, next_states, np.arange(n) == n - 1)
+
+    # batch_size transitions drawn with replacement, uniformly or in proportion to priority ** alpha
+    # prioritized batches come with importance sampling weights (size * p) ** -beta, scaled so the largest is 1
+    def sample(self, batch_size: int, rng: BatchedRng, prioritized: bool = False,
+               alpha: float = REPLAY_PRIORITY_ALPHA, beta: float = REPLAY_PRIORITY_BETA) -> ReplayBatch:
+        assert self.size > 0, 'nothing to sample from'
+        if prioritized:
+            probabilities = self.priorities[:self.size] ** alpha
+            probabilities /= probabilities.sum()
+            indices = rng.generator.choice(self.size, batch_size, p=probabilities)
+            weights = (self.size * probabilities[indices]) ** -beta
+            weights /= weights.max()
+        else:
+            indices = rng.generator.integers(0, self.size, batch_size)
+            weights = np.ones(batch_size)
+        return ReplayBatch(indices, self.states[indices], self.actions[indices].astype(np.int64),
+                           self.rewards[indices], self.next_states[indices], self.dones[indices], weights)
+
+    # priorities follow the size of each sampled transition's last error
+    def update_priorities(self, indices, errors):
+        priorities = np.abs(errors) + REPLAY_PRIORITY_EPSILON
+        self.priorities[indices] = priorities
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+
+    # one .npy file per field plus the ring's position, in a directory, so load can memory map them
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for field in FIELDS:
+            np.save(os.path.join(path, f'{field}.npy'), getattr(self, field))
+        with open(os.path.join(path, 'buffer.json'), 'w') as meta_file:
+            json.dump({'capacity': self.capacity, 'position': self.position, 'size': self.size,
+                       'max_priority': self.max_priority}, meta_file)
+
+    # mmap_mode 'r' maps the saved transitions read only for training from them, with the priorities
+    # copied into memory so prioritized sampling can still move them; 'r+' keeps writing into the files,
+    # None reads everything into memory
+    @staticmethod
+    def load(path: str, mmap_mode: str = 'r'):
+        with open(os.path.join(path, 'buffer.json')) as meta_file:
+            meta = json.load(meta_file)
+        buffer = ReplayBuffer.__new__(ReplayBuffer)
+        buffer.capacity = meta['capacity']
+        buffer.position = meta['position']
+        buffer.size = meta['size']
+        buffer.max_priority = meta['max_priority']
+        for field in FIELDS:
+            setattr(buffer, field, np.load(os.path.join(path, f'{field}.npy'), mmap_mode=mmap_mode))
+        if mmap_mode == 'r':
+            buffer.priorities = np.array(buffer.priorities)
+        return buffer
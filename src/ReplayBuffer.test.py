@@ -0,0 +1,96 @@
+import tempfile
+
+import numpy as np
+
+from src.BlackjackTable import BlackjackTable
+from src.Player import NNDecisionEngine, QDecisionEngine, QPlayer
+from src.ReplayBuffer import ReplayBuffer
+from src.Rng import BatchedRng
+
+
+def test_ring_overwrites_oldest():
+    buffer = ReplayBuffer(4)
+    for i in range(3):
+        buffer.add(i, 1, 0.0, i + 1, False)
+    buffer.extend(np.array([10, 11, 12]), np.array([0, 0, 0]), 1.0, np.array([-1, -1, -1]), True)
+    assert len(buffer) == 4
+    assert buffer.position == 2
+    assert buffer.states.tolist() == [11, 12, 2, 10]
+    assert buffer.dones.tolist() == [True, True, False, True]
+
+    # more than the capacity at once keeps the newest
+    buffer.extend(np.arange(20, 30), np.zeros(10), 0.0, np.full(10, -1), False)
+    assert sorted(buffer.states.tolist()) == [26, 27, 28, 29]
+
+
+def test_add_episode():
+    buffer = ReplayBuffer(8)
+    buffer.add_episode(np.array([5, 6, 7]), np.array([0, 0, 1]), -2)
+    assert buffer.next_states[:3].tolist() == [6, 7, -1]
+    assert buffer.rewards[:3].tolist() == [0, 0, -2]
+    assert buffer.dones[:3].tolist() == [False, False, True]
+
+
+def test_sampling():
+    buffer = ReplayBuffer(100)
+    buffer.extend(np.arange(50), np.zeros(50), 0.0, np.full(50, -1), True)
+    rng = BatchedRng(1)
+    batch = buffer.sample(32, rng)
+    assert batch.states.max() < 50
+    assert np.all(batch.weights == 1)
+
+    # all the priority on one transition pulls nearly every sample to it
+    buffer.update_priorities(np.arange(50), np.zeros(50))
+    buffer.update_priorities(np.array([7]), np.array([100.0]))
+    batch = buffer.sample(200, rng, prioritized=True)
+    assert np.mean(batch.states == 7) > 0.9
+    assert batch.weights.max() == 1
+    assert batch.weights[batch.states == 7].min() < batch.weights[batch.states != 7].max()
+
+
+def test_save_and_memory_map():
+    buffer = ReplayBuffer(16)
+    buffer.add_episode(np.array([1, 2]), np.array([0, 1]), 3)
+    with tempfile.TemporaryDirectory() as data_dir:
+        buffer.save(f'{data_dir}/replay')
+        loaded = ReplayBuffer.load(f'{data_dir}/replay')
+        assert isinstance(loaded.states, np.memmap)
+        assert len(loaded) == 2
+        assert loaded.states[:2].tolist() == [1, 2]
+        assert loaded.rewards[:2].tolist() == [0, 3]
+        # read only transitions, prioritized sampling still works
+        batch = loaded.sample(8, BatchedRng(2), prioritized=True)
+        loaded.update_priorities(batch.indices, np.ones(8))
+
+        writable = ReplayBuffer.load(f'{data_dir}/replay', mmap_mode='r+')
+        writable.add(9, 0, 1.0, -1, True)
+        del writable
+        assert ReplayBuffer.load(f'{data_dir}/replay', mmap_mode=None).states[2] == 9
+
+
+def test_retrain_from_recorded_play():
+    table = BlackjackTable(0, rng=BatchedRng(3))
+    player = QPlayer('rick', 1000, rng=BatchedRng(4), learning='td')
+    player.replay = ReplayBuffer(5000)
+    table.add_player(player)
+    for _ in range(500):
+        table.complete_a_round()
+    assert len(player.replay) >= 500
+
+    # a fresh table learns from the recording alone, and replayed errors shrink as it does
+    rng = BatchedRng(5)
+    engine = QDecisionEngine(learning='td', learning_rate=0.1)
+    errors = []
+    for _ in range(300):
+        batch = player.replay.sample(64, rng, prioritized=True)
+        batch_errors = engine.learn_replay(batch)
+        player.replay.update_priorities(batch.indices, batch_errors)
+        errors.append(np.mean(np.abs(batch_errors)))
+    assert engine.states.values.min() < 0
+    assert np.mean(errors[-50:]) < np.mean(errors[:50])
+
+    network = NNDecisionEngine(BatchedRng(6))
+    for _ in range(20):
+        network.train_replay(player.replay.sample(64, rng))
+    assert network.train_steps == 20
+    assert np.isfinite(network.last_loss)
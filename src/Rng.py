@@ -0,0 +1,49 @@
+from typing import List, Sequence
+
+import numpy as np
+
+from src.constants import *
+
+class BatchedRng:
+    # explicit random stream for a table, deck or decision engine
+    # single draws are served from batches pre-generated by a numpy Generator, so hot loops don't
+    # pay a numpy call per number; the same seed always gives the same sequence of draws
+    # spawn() hands out independent child streams for parallel tables and workers
+    def __init__(self, seed=None, batch_size: int = RNG_BATCH_SIZE) -> None:
+        if isinstance(seed, np.random.SeedSequence):
+            self.seed_sequence = seed
+        else:
+            self.seed_sequence = np.random.SeedSequence(seed)
+        self.generator = np.random.default_rng(self.seed_sequence)
+        self.batch_size = batch_size
+        self._batch = []
+        self._index = 0
+
+    def spawn(self, n: int) -> List['BatchedRng']:
+        return [BatchedRng(child, self.batch_size) for child in self.seed_sequence.spawn(n)]
+
+    # uniform float in [0, 1)
+    def random(self) -> float:
+        if self._index == len(self._batch):
+            self._batch = self.generator.random(self.batch_size).tolist()
+            self._index = 0
+        value = self._batch[self._index]
+        self._index += 1
+        return value
+
+    # integer in [low, high], both ends included like random.randint
+    def randint(self, low: int, high: int) -> int:
+        return low + int(self.random() * (high - low + 1))
+
+    def choice(self, seq: Sequence):
+        return seq[int(self.random() * len(seq))]
+
+    # index picked in proportion to weights, like random.choices(range(len(weights)), weights)[0]
+    def choice_index(self, weights: Sequence[float]) -> int:
+        shot = self.random() * sum(weights)
+        for index, weight in enumerate(weights):
+            shot -= weight
+            if shot < 0:
+                return index
+        # only reachable through float rounding, take the last index with any weight
+        return max(i for i, weight in enumerate(weights) if weight > 0)
@@ -0,0 +1,18 @@
+from src.Rng import BatchedRng
+
+def test_seeded_streams_repeat():
+    a, b = BatchedRng(42, batch_size=8), BatchedRng(42, batch_size=3)
+    # the batch size only changes how often numpy is called, not the numbers
+    assert [a.random() for _ in range(20)] == [b.random() for _ in range(20)]
+
+def test_spawned_streams_differ():
+    first, second = BatchedRng(42).spawn(2)
+    assert first.random() != second.random()
+    again, _ = BatchedRng(42).spawn(2)
+    assert BatchedRng(42).spawn(2)[0].random() == again.random()
+
+def test_draws_in_range():
+    rng = BatchedRng(1)
+    assert {rng.randint(3, 5) for _ in range(200)} == {3, 4, 5}
+    assert rng.choice(['a']) == 'a'
+    assert {rng.choice_index([0, 1, 0, 2]) for _ in range(200)} == {1, 3}
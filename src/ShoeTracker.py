@@ -0,0 +1,47 @@
+from src.constants import *
+
+# tag added to the running count for each card value seen, index 1-10 (ace is 1)
+COUNT_SYSTEMS = {
+    'hi-lo': [0, -1, 1, 1, 1, 1, 1, 0, 0, 0, -1],
+    'ko': [0, -1, 1, 1, 1, 1, 1, 1, 0, 0, -1],
+    'hi-opt-1': [0, 0, 0, 1, 1, 1, 1, 0, 0, 0, -1],
+    'omega-2': [0, 0, 1, 1, 2, 2, 2, 1, 0, -1, -2]
+}
+
+
+class ShoeTracker:
+    # what is left in the shoe as far as anyone at the table has seen, updated one card at a time
+    # counts[v] is how many cards of value v (1-10) have not been seen since the last shuffle,
+    # the running count adds the count system's tag for every seen card, the true count spreads it per deck left
+    def __init__(self, num_decks: int = NUM_DECKS, count_system: str = COUNT_SYSTEM) -> None:
+        self.num_decks = num_decks
+        self.count_system = count_system
+        self.tags = COUNT_SYSTEMS[count_system]
+        self.full_counts = [0] * 11
+        for v in VALUES:
+            self.full_counts[v] += num_decks * len(SUITS)
+        self.reset()
+
+    # a fresh shoe, called whenever the deck is shuffled
+    def reset(self):
+        self.counts = list(self.full_counts)
+        self.remaining = sum(self.counts)
+        self.running_count = 0
+        self.cards_seen = 0
+
+    def see(self, value: int):
+        self.counts[value] -= 1
+        self.remaining -= 1
+        self.running_count += self.tags[value]
+        self.cards_seen += 1
+
+    def decks_remaining(self) -> float:
+        # never less than half a deck, so the last cards of a shoe can't blow the true count up
+        return max(self.remaining / (len(SUITS) * len(VALUES)), 0.5)
+
+    def true_count(self) -> float:
+        return self.running_count / self.decks_remaining()
+
+    # chance that the next card is of value v, as far as the table knows
+    def probability(self, value: int) -> float:
+        return self.counts[value] / self.remaining if self.remaining else 0.0
@@ -0,0 +1,22 @@
+from src.constants import *
+from src.ShoeTracker import ShoeTracker
+
+def test_counts():
+    shoe = ShoeTracker(2)
+    assert shoe.remaining == 104 and shoe.counts[10] == 32
+    for value in (2, 5, 10, 1, 3):
+        shoe.see(value)
+    assert shoe.remaining == 99 and shoe.counts[10] == 31 and shoe.counts[1] == 7
+    # hi-lo: +1 for 2-6, -1 for tens and aces
+    assert shoe.running_count == 1
+    assert abs(shoe.true_count() - 1 / (99 / 52)) < 1e-9
+    assert shoe.probability(10) == 31 / 99
+
+    shoe.reset()
+    assert shoe.running_count == 0 and shoe.counts == shoe.full_counts
+
+def test_count_systems():
+    shoe = ShoeTracker(1, 'omega-2')
+    for value in (4, 5, 9, 10):
+        shoe.see(value)
+    assert shoe.running_count == 2 + 2 - 1 - 2
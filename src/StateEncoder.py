@@ -0,0 +1,179 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from src.constants import *
+
+# composition id of a hand whose hard total went over 21
+BUST = -1
+
+class CompositionIndex:
+    # numbers every multiset of card values (aces counted as 1) with a hard total of 21 or less,
+    # the empty hand is 0, then hands are ordered by number of cards and sorted values
+    def __init__(self, max_total: int = 21) -> None:
+        compositions = []
+
+        def build(value, remaining, counts):
+            if value > 10:
+                compositions.append(counts)
+                return
+            for k in range(remaining // value + 1):
+                build(value + 1, remaining - k * value, counts + (k,))
+
+        build(1, max_total, ())
+        compositions.sort(key=lambda counts: (sum(counts), self._values_of(counts)))
+
+        self.compositions = compositions
+        self.ids = {counts: i for i, counts in enumerate(compositions)}
+        self.num_cards = [sum(counts) for counts in compositions]
+        self.hard_totals = [sum((v + 1) * k for v, k in enumerate(counts)) for counts in compositions]
+        self.num_aces = [counts[0] for counts in compositions]
+        # what a hand of each composition looks like at the table, as arrays for batched lookups
+        self.totals = np.array([self.total_of(i)[0] for i in range(len(compositions))])
+        self.is_soft = np.array([not self.total_of(i)[1] for i in range(len(compositions))])
+        self.is_pair = np.array([sum(counts) == 2 and max(counts) == 2 for counts in compositions])
+        self.num_cards_array = np.array(self.num_cards)
+
+        # transitions[id][value] is the composition after drawing a card of that value
+        self.transitions = []
+        for counts in compositions:
+            row = [BUST] * 11
+            for value in range(1, 11):
+                grown = counts[:value - 1] + (counts[value - 1] + 1,) + counts[value:]
+                row[value] = self.ids.get(grown, BUST)
+            self.transitions.append(row)
+
+    def __len__(self) -> int:
+        return len(self.compositions)
+
+    @staticmethod
+    def _values_of(counts) -> Tuple[int, ...]:
+        return tuple(v + 1 for v, k in enumerate(counts) for _ in range(k))
+
+    def id_of(self, counts) -> int:
+        return self.ids.get(tuple(counts), BUST)
+
+    def add(self, composition_id: int, value: int) -> int:
+        if composition_id == BUST:
+            return BUST
+        return self.transitions[composition_id][value]
+
+    def values_of(self, composition_id: int) -> Tuple[int, ...]:
+        return self._values_of(self.compositions[composition_id])
+
+    def total_of(self, composition_id: int) -> Tuple[int, bool]:
+        hard_total = self.hard_totals[composition_id]
+        if self.num_aces[composition_id] and hard_total + 10 <= 21:
+            return hard_total + 10, False
+        return hard_total, True
+
+
+# shared by every Hand, built once at import
+COMPOSITION_INDEX = CompositionIndex()
+
+
+class StateEncoder:
+    # maps (dealer upcard, hand) to a dense integer state id and back
+    #   'composition' - one state per distinct set of card values in the hand
+    #   'total'       - one state per hard/soft total, pairs get their own state per pair value
+    def __init__(self, mode: str = Q_STATE_ENCODING, include_dealer: bool = INCLUDE_DEALER_IN_Q_STATE,
+                 index: CompositionIndex = COMPOSITION_INDEX) -> None:
+        assert mode in ('composition', 'total')
+        self.mode = mode
+        self.include_dealer = include_dealer
+        self.index = index
+
+        # hand_state_of[composition id] -> hand state, hand_states[hand state] -> readable descriptor
+        self.hand_states: List[Tuple] = []
+        self.hand_state_of: List[int] = []
+        descriptor_ids = {}
+        for composition_id in range(len(index)):
+            descriptor = self._describe_composition(composition_id)
+            if descriptor not in descriptor_ids:
+                descriptor_ids[descriptor] = len(self.hand_states)
+                self.hand_states.append(descriptor)
+            self.hand_state_of.append(descriptor_ids[descriptor])
+        self.hand_state_ids = descriptor_ids
+        self.hand_state_array = np.array(self.hand_state_of, dtype=np.int64)
+
+        self.num_hand_states = len(self.hand_states)
+        self.num_dealer_states = 10 if include_dealer else 1
+        self.num_states = self.num_dealer_states * self.num_hand_states
+
+    def _describe_composition(self, composition_id: int) -> Tuple:
+        if self.mode == 'composition':
+            return ('cards',) + self.index.values_of(composition_id)
+        values = self.index.values_of(composition_id)
+        if len(values) == 2 and values[0] == values[1]:
+            return ('pair', values[0])
+        total, is_hard = self.index.total_of(composition_id)
+        return ('hard' if is_hard else 'soft', total)
+
+    def encode(self, dealer_card, hand) -> int:
+        # only hands that are still live (not busted) have a state
+        assert hand.composition_id != BUST
+        return self.encode_ids(dealer_card.value, hand.composition_id)
+
+    def encode_ids(self, dealer_value: int, composition_id: int) -> int:
+        hand_state = self.hand_state_of[composition_id]
+        if self.include_dealer:
+            return (dealer_value - 1) * self.num_hand_states + hand_state
+        return hand_state
+
+    # encode_ids for arrays of dealer values and composition ids
+    def encode_many(self, dealer_values, composition_ids) -> np.ndarray:
+        hand_states = self.hand_state_array[np.asarray(composition_ids, dtype=np.int64)]
+        if self.include_dealer:
+            return (np.asarray(dealer_values, dtype=np.int64) - 1) * self.num_hand_states + hand_states
+        return hand_states
+
+    # (dealer values, hand states) for an array of state ids, the dealer values are all 1 without a dealer
+    def decode_many(self, state_ids):
+        state_ids = np.asarray(state_ids, dtype=np.int64)
+        if self.include_dealer:
+            return state_ids // self.num_hand_states + 1, state_ids % self.num_hand_states
+        return np.ones_like(state_ids), state_ids
+
+    def decode(self, state_id: int) -> Tuple:
+        # (dealer value or None, hand descriptor)
+        if self.include_dealer:
+            dealer_index, hand_state = divmod(state_id, self.num_hand_states)
+            return dealer_index + 1, self.hand_states[hand_state]
+        return None, self.hand_states[state_id]
+
+    # human readable key, compositions use the same format as the original player files, e.g. "9-[['9', '9']]"
+    def describe(self, state_id: int) -> str:
+        dealer_value, descriptor = self.decode(state_id)
+        if descriptor[0] == 'cards':
+            key = str([[str(v) for v in descriptor[1:]]])
+        else:
+            key = f'{descriptor[0]} {descriptor[1]}'
+        if dealer_value is not None:
+            key = f'{dealer_value}-' + key
+        return key
+
+    # inverse of describe, raises ValueError for keys that don't belong to this encoder
+    def parse(self, key: str) -> int:
+        dealer_value = 1
+        if self.include_dealer:
+            dealer_part, sep, key = key.partition('-')
+            if not sep or not dealer_part.isdigit():
+                raise ValueError(f'state key {key} has no dealer card')
+            dealer_value = int(dealer_part)
+
+        if key.startswith('[['):
+            values = tuple(int(v.strip(" '")) for v in key.strip('[]').split(',') if v.strip(" '"))
+            counts = [0] * 10
+            for v in values:
+                counts[v - 1] += 1
+            composition_id = self.index.id_of(counts)
+            if composition_id == BUST:
+                raise ValueError(f'state key {key} is not a live hand')
+            return self.encode_ids(dealer_value, composition_id)
+
+        kind, _, value = key.partition(' ')
+        descriptor = (kind, int(value)) if value.isdigit() else None
+        if descriptor not in self.hand_state_ids:
+            raise ValueError(f'unknown state key {key}')
+        hand_state = self.hand_state_ids[descriptor]
+        return (dealer_value - 1) * self.num_hand_states + hand_state if self.include_dealer else hand_state
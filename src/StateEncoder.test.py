@@ -0,0 +1,44 @@
+import json
+
+from src.Card import Card
+from src.Hand import Hand
+from src.StateEncoder import COMPOSITION_INDEX, BUST, StateEncoder
+
+def test_composition_index():
+    # every set of card values with a hard total of at most 21
+    assert len(COMPOSITION_INDEX) == 3083
+    assert COMPOSITION_INDEX.compositions[0] == (0,) * 10
+
+    h = Hand([Card('spades', 1), Card('hearts', 6)])
+    assert COMPOSITION_INDEX.values_of(h.composition_id) == (1, 6)
+    assert COMPOSITION_INDEX.total_of(h.composition_id) == h.sum()
+
+    h.add_card(Card('clubs', 10))
+    h.add_card(Card('clubs', 10))
+    assert h.composition_id == BUST
+
+def test_round_trip():
+    for mode in ('composition', 'total'):
+        encoder = StateEncoder(mode)
+        for state_id in range(0, encoder.num_states, 97):
+            assert encoder.parse(encoder.describe(state_id)) == state_id
+
+def test_total_mode():
+    encoder = StateEncoder('total')
+    dealer = Card('clubs', 6)
+    soft_17 = encoder.encode(dealer, Hand([Card('spades', 1), Card('hearts', 6)]))
+    also_soft_17 = encoder.encode(dealer, Hand([Card('spades', 1), Card('hearts', 2), Card('hearts', 4)]))
+    assert soft_17 == also_soft_17
+    assert encoder.describe(soft_17) == '6-soft 17'
+
+    pair = encoder.encode(dealer, Hand([Card('spades', 8), Card('hearts', 8)]))
+    assert encoder.describe(pair) == '6-pair 8'
+
+def test_legacy_player_file():
+    with open('player_data/test_danny.json') as player_file:
+        payload = json.load(player_file)
+    payload.pop('metadata')
+
+    encoder = StateEncoder('composition', include_dealer=True)
+    for key in payload.keys():
+        assert encoder.describe(encoder.parse(key)) == key
@@ -0,0 +1,412 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from src.constants import *
+from src.BlackjackTable import BlackjackTable, apply_preaction
+from src.Deck import Deck
+from src.Player import BasePlayer
+from src.Rng import BatchedRng
+
+# line protocol, one json object per line each way; a connection can hold any number of seats,
+# each named by an id the client picks
+# client -> host:
+#   {"op": "join", "seat": id, "name": "...", "chips": 1000, "table": index}   name, chips and table are optional
+#   {"op": "act", "seat": id, "action": "hit" | "stay" | "split" | "double"}     only after a "decide" for the seat
+#   {"op": "leave", "seat": id}
+# host -> client:
+#   {"event": "seated", "seat": id, "table": index}
+#   {"event": "decide", "seat": id, "upcard": 10, "hand": [10, 6], "total": 16, "legal": ["hit", "stay"]}
+#   {"event": "result", "seat": id, "outcome": "win" | "loss" | "push", "chips": 1001, "dealer": [10, 7]}
+#   {"event": "left", "seat": id, "chips": 1001}
+#   {"event": "error", "seat": id, "reason": "..."}
+
+
+class RemotePlayer(BasePlayer):
+    # a seat whose decisions arrive over a host connection, the host plays its hand for it
+    # nothing is saved, the client keeps whatever it wants to keep
+    def __init__(self, name, initial_chip_count, connection, seat):
+        super(RemotePlayer, self).__init__(name, initial_chip_count, is_dealer=False)
+        self.connection = connection
+        self.seat = seat
+        self.table_index = None
+        # the future the host is waiting on for this seat's next action, and the actions it may answer with
+        self.decision = None
+        self.legal = []
+        self.missed_rounds = 0
+        self.leaving = False
+        self.outcome = None
+
+    def last_action_good(self):
+        self.outcome = 'win'
+        super().last_action_good()
+
+    def last_action_bad(self):
+        self.outcome = 'loss'
+        super().last_action_bad()
+
+    def last_action_neutral(self):
+        self.outcome = 'push'
+        super().last_action_neutral()
+
+    def load_from_file(self):
+        pass
+
+    def save_to_file(self):
+        pass
+
+    def as_filename(self):
+        return None
+
+    def get_bet_value(self):
+        return super().get_bet_value()
+
+
+class Connection:
+    # one client socket; everything sent to it goes through a bounded outbox drained by its own task,
+    # so a table never waits on a client's socket, and a client that lets the outbox fill up is dropped
+    def __init__(self, host, writer, queue_size: int = HOST_SEND_QUEUE_SIZE) -> None:
+        self.host = host
+        self.writer = writer
+        self.outbox = asyncio.Queue(queue_size)
+        self.seats = {}
+        self.closed = False
+        self.writer_task = asyncio.get_running_loop().create_task(self.write_loop())
+
+    def send(self, message: dict):
+        if self.closed:
+            return
+        try:
+            self.outbox.put_nowait(message)
+        except asyncio.QueueFull:
+            self.host.logger.warning(f'dropping a client {self.outbox.maxsize} messages behind')
+            self.close()
+
+    async def write_loop(self):
+        try:
+            while True:
+                message = await self.outbox.get()
+                self.writer.write(json.dumps(message).encode() + b'\n')
+                # only wait on the socket once everything queued so far is written
+                if self.outbox.empty():
+                    await self.writer.drain()
+        except ConnectionError:
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for p in list(self.seats.values()):
+            self.host.leave(p)
+        self.writer_task.cancel()
+        self.writer.close()
+
+
+class TableHost:
+    # runs many BlackjackTables in one event loop, one coroutine per table, and seats remote players on them
+    # players join and leave between rounds only; a join waits for the round in progress to finish
+    # in a round the table asks its remote seats in order, sharing one round_timeout between them;
+    # a seat that hasn't answered in time stands, and one that times out max_missed_rounds rounds in a row is removed
+    # tables without players sleep until someone joins, so idle tables cost nothing
+    def __init__(self, num_tables: int, seats_per_table: int = HOST_SEATS_PER_TABLE,
+                 round_timeout: float = HOST_ROUND_TIMEOUT, max_missed_rounds: int = HOST_MAX_MISSED_ROUNDS,
+                 send_queue_size: int = HOST_SEND_QUEUE_SIZE, num_decks: int = NUM_DECKS,
+                 rng: BatchedRng = None) -> None:
+        rng = rng or BatchedRng()
+        self.tables = [BlackjackTable(0, deck=Deck(num_decks, rng=table_rng.spawn(1)[0]), rng=table_rng)
+                       for table_rng in rng.spawn(num_tables)]
+        self.seats_per_table = seats_per_table
+        self.round_timeout = round_timeout
+        self.max_missed_rounds = max_missed_rounds
+        self.send_queue_size = send_queue_size
+
+        # players waiting for their table's round to end before they sit down, and the seats taken or promised
+        self.joins = [[] for _ in self.tables]
+        self.occupancy = [0] * len(self.tables)
+        self.wakes = None
+        self.tasks = []
+        self.server = None
+        self.rounds_played = 0
+        self.logger = logging.getLogger(__name__)
+
+    # listens on a unix socket when given a path, on host:port otherwise; port 0 picks a free one
+    async def serve(self, host: str = '127.0.0.1', port: int = HOST_PORT, path: str = None):
+        if path:
+            self.server = await asyncio.start_unix_server(self.handle_connection, path, limit=HOST_MAX_LINE_BYTES)
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, host, port, limit=HOST_MAX_LINE_BYTES)
+        self.start()
+        return self.server
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self.wakes = [asyncio.Event() for _ in self.tables]
+        self.tasks = [loop.create_task(self.run_table(i)) for i in range(len(self.tables))]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def port(self) -> int:
+        return self.server.sockets[0].getsockname()[1]
+
+    # index of the requested table if it has a free seat, else of the first table with one; None when all are full
+    def find_table(self, requested=None):
+        if requested is not None:
+            if 0 <= requested < len(self.tables) and self.occupancy[requested] < self.seats_per_table:
+                return requested
+            return None
+        for i, taken in enumerate(self.occupancy):
+            if taken < self.seats_per_table:
+                return i
+        return None
+
+    def join(self, p: RemotePlayer, table_index: int):
+        p.table_index = table_index
+        self.occupancy[table_index] += 1
+        self.joins[table_index].append(p)
+        self.wakes[table_index].set()
+
+    # the seat goes at the end of its table's round; a decision it still owes is answered with a stay
+    def leave(self, p: RemotePlayer):
+        p.leaving = True
+        if p.decision is not None and not p.decision.done():
+            p.decision.set_result(ACTIONS.index('stay'))
+
+    def remove(self, p: RemotePlayer):
+        self.occupancy[p.table_index] -= 1
+        p.connection.seats.pop(p.seat, None)
+        p.connection.send({'event': 'left', 'seat': p.seat, 'chips': p.chips})
+
+    # between rounds: sit the players that joined, let go of the ones leaving
+    def seat_waiting(self, table_index: int):
+        table = self.tables[table_index]
+        for p in [p for p in table.players if p.leaving]:
+            table.players.remove(p)
+            self.remove(p)
+        joins, self.joins[table_index] = self.joins[table_index], []
+        for p in joins:
+            if p.leaving:
+                self.remove(p)
+                continue
+            table.add_player(p)
+            p.connection.send({'event': 'seated', 'seat': p.seat, 'table': table_index})
+
+    async def run_table(self, table_index: int):
+        table = self.tables[table_index]
+        wake = self.wakes[table_index]
+        while True:
+            self.seat_waiting(table_index)
+            if not table.players:
+                wake.clear()
+                await wake.wait()
+                continue
+            await self.play_round(table)
+            self.rounds_played += 1
+            # a table whose seats answer straight away would otherwise never hand the loop back
+            await asyncio.sleep(0)
+
+    async def play_round(self, table: BlackjackTable):
+        for p in table.players:
+            p.outcome = None
+        round_start = time.perf_counter()
+        if table.start_round():
+            deadline = asyncio.get_running_loop().time() + self.round_timeout
+            for p in table.players:
+                if isinstance(p, RemotePlayer):
+                    seat_start = time.perf_counter()
+                    await self.play_remote_seat(table, p, deadline)
+                    # awaited rather than called, so the table's stats can't wrap it
+                    if table.stats is not None:
+                        table.stats.record('preaction', time.perf_counter() - seat_start)
+                else:
+                    table.process_player_preaction(p)
+            table.finish_round()
+        if table.stats is not None:
+            table.stats.record('round', time.perf_counter() - round_start)
+
+        dealer = [c.value for c in table.dealer.get_hand().cards]
+        for p in table.players:
+            if isinstance(p, RemotePlayer):
+                p.connection.send({'event': 'result', 'seat': p.seat, 'outcome': p.outcome,
+                                   'chips': p.chips, 'dealer': dealer})
+
+    # the remote counterpart of process_player_preaction, asking the client for each action
+    async def play_remote_seat(self, table: BlackjackTable, p: RemotePlayer, deadline: float):
+        loop = asyncio.get_running_loop()
+        upcard = table.dealer.get_showing_card().value
+        timed_out = False
+        # blackjacks stay without asking
+        playing = not p.get_hand().is_blackjack()
+        while playing:
+            action = ACTIONS.index('stay')
+            if not p.leaving and not timed_out:
+                hand = p.get_hand()
+                p.legal = ['hit', 'stay'] + ['split'] * hand.can_split() + ['double'] * hand.can_double()
+                p.decision = loop.create_future()
+                p.connection.send({'event': 'decide', 'seat': p.seat, 'upcard': upcard,
+                                   'hand': [c.value for c in hand.cards], 'total': hand.sum()[0], 'legal': p.legal})
+                try:
+                    action = await asyncio.wait_for(p.decision, max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    timed_out = True
+                p.decision = None
+            playing = apply_preaction(table, p, action)
+
+        p.missed_rounds = p.missed_rounds + 1 if timed_out else 0
+        if p.missed_rounds >= self.max_missed_rounds:
+            self.logger.info(f'{p.get_name()} timed out {p.missed_rounds} rounds in a row, removing')
+            self.leave(p)
+
+    async def handle_connection(self, reader, writer):
+        connection = Connection(self, writer, self.send_queue_size)
+        try:
+            # one line is handled before the next is read, so a client sending faster than the
+            # host handles its messages fills its own socket buffers rather than the host's memory
+            while not connection.closed:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    connection.send({'event': 'error', 'seat': None, 'reason': 'not json'})
+                    continue
+                self.handle_message(connection, message)
+        except (ConnectionError, ValueError):
+            # reset, or a line longer than HOST_MAX_LINE_BYTES
+            pass
+        finally:
+            connection.close()
+
+    def handle_message(self, connection: Connection, message):
+        op = message.get('op') if isinstance(message, dict) else None
+        seat = message.get('seat') if isinstance(message, dict) else None
+        p = connection.seats.get(seat) if isinstance(seat, (int, str)) else None
+
+        def error(reason):
+            connection.send({'event': 'error', 'seat': seat, 'reason': reason})
+
+        if op == 'join':
+            if not isinstance(seat, (int, str)) or p is not None:
+                return error('seat id missing or already in use')
+            requested, chips = message.get('table'), message.get('chips', HOST_STARTING_CHIPS)
+            if not isinstance(chips, int) or not (requested is None or isinstance(requested, int)):
+                return error('chips and table must be integers')
+            table_index = self.find_table(requested)
+            if table_index is None:
+                return error('no free seat')
+            p = RemotePlayer(str(message.get('name', seat)), chips, connection, seat)
+            connection.seats[seat] = p
+            self.join(p, table_index)
+        elif op == 'act':
+            action = message.get('action')
+            if p is None or p.decision is None or p.decision.done():
+                return error('not waiting on this seat')
+            if action not in p.legal:
+                return error(f'{action} is not one of {p.legal}')
+            p.decision.set_result(ACTIONS.index(action))
+        elif op == 'leave':
+            if p is None:
+                return error('no such seat')
+            self.leave(p)
+        else:
+            error(f'unknown op {op}')
+
+
+# stand-in client for load testing: num_seats bot seats spread over a few connections, each hitting
+# below stand_on and standing otherwise, every seat leaves after playing rounds rounds
+async def run_bots(num_seats: int, rounds: int, host: str = '127.0.0.1', port: int = HOST_PORT, path: str = None,
+                   connections: int = 1, stand_on: int = 17) -> dict:
+    summary = {'seats': num_seats, 'rounds': 0, 'decisions': 0, 'rejected': 0,
+               'outcomes': {'win': 0, 'loss': 0, 'push': 0}}
+
+    async def bot_connection(seats):
+        if path:
+            reader, writer = await asyncio.open_unix_connection(path, limit=HOST_MAX_LINE_BYTES)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=HOST_MAX_LINE_BYTES)
+        played = dict.fromkeys(seats, 0)
+        writer.write(b''.join(json.dumps({'op': 'join', 'seat': s, 'name': f'bot-{s}'}).encode() + b'\n'
+                              for s in seats))
+        await writer.drain()
+        while played:
+            line = await reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            event, seat = message['event'], message['seat']
+            if event == 'decide':
+                action = 'hit' if message['total'] < stand_on else 'stay'
+                writer.write(json.dumps({'op': 'act', 'seat': seat, 'action': action}).encode() + b'\n')
+                summary['decisions'] += 1
+            elif event == 'result' and played[seat] < rounds:
+                # a seat leaves at the end of the round after its leave arrives, results past rounds aren't counted
+                summary['rounds'] += 1
+                summary['outcomes'][message['outcome']] += 1
+                played[seat] += 1
+                if played[seat] == rounds:
+                    writer.write(json.dumps({'op': 'leave', 'seat': seat}).encode() + b'\n')
+            elif event == 'left':
+                played.pop(seat, None)
+            elif event == 'error' and message['reason'] == 'no free seat':
+                summary['rejected'] += 1
+                played.pop(seat, None)
+            await writer.drain()
+        writer.close()
+
+    start = time.perf_counter()
+    seat_ids = list(range(num_seats))
+    await asyncio.gather(*(bot_connection(seat_ids[i::connections]) for i in range(connections)))
+    summary['seconds'] = time.perf_counter() - start
+    summary['rounds_per_second'] = summary['rounds'] / max(summary['seconds'], 1e-9)
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='host many blackjack tables, or load test a host with bot seats')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help='run the table host')
+    serve.add_argument('--tables', type=int, default=100)
+    serve.add_argument('--seats-per-table', type=int, default=HOST_SEATS_PER_TABLE)
+    serve.add_argument('--round-timeout', type=float, default=HOST_ROUND_TIMEOUT)
+    serve.add_argument('--decks', type=int, default=NUM_DECKS)
+    serve.add_argument('--seed', type=int, default=None, help='seed for reproducible runs')
+    bots = commands.add_parser('bots', help='drive bot seats against a running host')
+    bots.add_argument('--seats', type=int, default=1000)
+    bots.add_argument('--rounds', type=int, default=100, help='rounds each seat plays before leaving')
+    bots.add_argument('--connections', type=int, default=10)
+    bots.add_argument('--stand-on', type=int, default=17)
+    for command in (serve, bots):
+        command.add_argument('--host', default='127.0.0.1')
+        command.add_argument('--port', type=int, default=HOST_PORT)
+        command.add_argument('--path', default=None, help='unix socket path, instead of host and port')
+        command.add_argument('--log-level', default='WARNING')
+    return parser.parse_args(argv)
+
+
+async def serve_forever(args):
+    table_host = TableHost(args.tables, args.seats_per_table, args.round_timeout, num_decks=args.decks,
+                           rng=BatchedRng(args.seed))
+    server = await table_host.serve(args.host, args.port, args.path)
+    print(f'hosting {args.tables} tables on {args.path or f"{args.host}:{table_host.port()}"}', flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logging.basicConfig(level=args.log_level)
+    if args.command == 'serve':
+        asyncio.run(serve_forever(args))
+    else:
+        summary = asyncio.run(run_bots(args.seats, args.rounds, args.host, args.port, args.path,
+                                       args.connections, args.stand_on))
+        print(json.dumps(summary, indent=2))
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+from src.Rng import BatchedRng
+from src.TableHost import TableHost, run_bots
+
+
+def test_bots_play_every_round():
+    async def run():
+        host = TableHost(8, seats_per_table=5, rng=BatchedRng(1))
+        stats = [t.enable_stats() for t in host.tables]
+        await host.serve(port=0)
+        summary = await run_bots(30, 20, port=host.port(), connections=3)
+        await asyncio.sleep(0.01)
+        await host.close()
+        return host, summary, stats
+
+    host, summary, stats = asyncio.run(run())
+    # remote seats' actions are timed with the rest of the round
+    assert sum(s.calls['round'] for s in stats) == host.rounds_played
+    assert sum(s.calls['preaction'] for s in stats) > 0
+    assert summary['rejected'] == 0
+    assert summary['rounds'] == 30 * 20
+    assert sum(summary['outcomes'].values()) == 30 * 20
+    assert summary['decisions'] > 0
+    # every seat left, so every table is empty again
+    assert host.occupancy == [0] * 8
+    assert all(not t.players for t in host.tables)
+
+
+def test_full_host_turns_joins_away():
+    async def run():
+        host = TableHost(2, seats_per_table=3, rng=BatchedRng(2))
+        await host.serve(port=0)
+        summary = await run_bots(10, 2, port=host.port(), connections=2)
+        await host.close()
+        return summary
+
+    summary = asyncio.run(run())
+    assert summary['rejected'] == 4
+    assert summary['rounds'] == 6 * 2
+
+
+def test_silent_seat_stands_then_is_removed():
+    async def run():
+        host = TableHost(1, round_timeout=0.02, max_missed_rounds=2, rng=BatchedRng(3))
+        await host.serve(port=0)
+        reader, writer = await asyncio.open_connection('127.0.0.1', host.port())
+        writer.write(json.dumps({'op': 'join', 'seat': 'quiet', 'chips': 10}).encode() + b'\n')
+        await writer.drain()
+        # never answers a decide, so every round ends in the seat standing once the round times out
+        events = []
+        while not events or events[-1]['event'] != 'left':
+            events.append(json.loads(await asyncio.wait_for(reader.readline(), 5)))
+        writer.close()
+        await host.close()
+        return events
+
+    events = asyncio.run(run())
+    assert events[0] == {'event': 'seated', 'seat': 'quiet', 'table': 0}
+    results = [e for e in events if e['event'] == 'result']
+    assert 2 <= len(results)
+    assert events[-1]['chips'] == results[-1]['chips']
+
+
+def test_protocol_errors():
+    async def run():
+        host = TableHost(1, rng=BatchedRng(4))
+        await host.serve(port=0)
+        reader, writer = await asyncio.open_connection('127.0.0.1', host.port())
+        for line in [b'nonsense', json.dumps({'op': 'act', 'seat': 1, 'action': 'hit'}).encode(),
+                     json.dumps({'op': 'fly'}).encode(), json.dumps({'op': 'join', 'seat': 1, 'table': 5}).encode()]:
+            writer.write(line + b'\n')
+        await writer.drain()
+        reasons = [json.loads(await asyncio.wait_for(reader.readline(), 5))['reason'] for _ in range(4)]
+        writer.close()
+        await host.close()
+        return reasons
+
+    assert asyncio.run(run()) == ['not json', 'not waiting on this seat', 'unknown op fly', 'no free seat']
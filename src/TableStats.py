@@ -0,0 +1,72 @@
+import time
+
+# the phases of a round, in the order they run
+PHASES = ['deal', 'preaction', 'dealer', 'result']
+# table methods timed under each phase, a dealer blackjack settles the players in the result phase
+PHASE_METHODS = {
+    'deal': ['deal'],
+    'preaction': ['process_player_preaction'],
+    'dealer': ['process_dealer_action'],
+    'result': ['process_player_result', 'process_dealer_blackjack']
+}
+
+
+class TableStats:
+    # wall time per round phase plus counters, collected for one table while it is enabled
+    # the timed methods are wrapped on the table instance only while stats are on,
+    # so a table without stats runs the plain methods and pays nothing
+    def __init__(self, table) -> None:
+        self.table = table
+        self.reset()
+
+    def reset(self):
+        self.seconds = dict.fromkeys(PHASES + ['round'], 0.0)
+        self.calls = dict.fromkeys(PHASES + ['round'], 0)
+        self.start_counters = self.read_counters()
+
+    # lifetime counters of the table's shoe and players, stats report the change since reset
+    def read_counters(self) -> dict:
+        players = self.table.players
+        return {
+            'cards_drawn': self.table.deck.cards_drawn(),
+            'shuffles': self.table.deck.shuffles,
+            'q_states_created': sum(len(p.decision_engine.states) for p in players
+                                    if getattr(p.decision_engine, 'states', None) is not None),
+            'saves': sum(p.saves for p in players)
+        }
+
+    def timed(self, phase: str, method):
+        seconds, calls, clock = self.seconds, self.calls, time.perf_counter
+
+        def timed_method(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                seconds[phase] += clock() - start
+                calls[phase] += 1
+        return timed_method
+
+    # for phases the caller times itself, like a remote seat's actions that are awaited rather than called
+    def record(self, phase: str, seconds: float):
+        self.seconds[phase] += seconds
+        self.calls[phase] += 1
+
+    def attach(self):
+        for phase, names in PHASE_METHODS.items():
+            for name in names:
+                setattr(self.table, name, self.timed(phase, getattr(self.table, name)))
+        self.table.complete_a_round = self.timed('round', self.table.complete_a_round)
+
+    def detach(self):
+        for name in sum(PHASE_METHODS.values(), ['complete_a_round']):
+            self.table.__dict__.pop(name, None)
+
+    def get_stats(self) -> dict:
+        counters = self.read_counters()
+        return {
+            'rounds': self.calls['round'],
+            'seconds': dict(self.seconds),
+            'calls': dict(self.calls),
+            'counters': {k: counters[k] - self.start_counters[k] for k in counters}
+        }
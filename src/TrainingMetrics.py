@@ -0,0 +1,134 @@
+import os
+import time
+
+import numpy as np
+
+from src.constants import *
+from src.Player import BasePlayer
+
+# one value of each per kept point and per csv row
+COLUMNS = ['hands', 'chips', 'wins', 'losses', 'draws', 'win_rate', 'window_win_rate', 'window_chips_per_hand',
+           'q_states', 'hands_per_second']
+
+
+class RollingWindow:
+    # mean of the last size values, constant memory and constant time per value
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.values = np.zeros(size)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float):
+        i = self.count % self.size
+        self.total += value - self.values[i]
+        self.values[i] = value
+        self.count += 1
+        # re-add from scratch once per lap so float error in the running total can't build up over a long run
+        if i == self.size - 1:
+            self.total = float(self.values.sum())
+
+    def mean(self) -> float:
+        n = min(self.count, self.size)
+        return self.total / n if n else 0.0
+
+
+class Reservoir:
+    # at most size evenly spaced rows of a series, however long it runs: every stride-th value is kept,
+    # and once the rows fill up every other one is dropped and the stride doubles, so the kept rows span the whole run
+    def __init__(self, size: int, num_columns: int) -> None:
+        assert size % 2 == 0
+        self.rows = np.zeros((size, num_columns))
+        self.count = 0
+        self.stride = 1
+        self.seen = 0
+
+    # whether the next value lands on a kept row, so callers only build rows that are kept
+    def due(self) -> bool:
+        return self.seen % self.stride == 0
+
+    # call once per value, with the row when due
+    def step(self, row=None):
+        if self.due():
+            if self.count == len(self.rows):
+                # size is even, so this value is on the doubled stride's grid as well
+                half = len(self.rows) // 2
+                self.rows[:half] = self.rows[::2]
+                self.count = half
+                self.stride *= 2
+            self.rows[self.count] = row
+            self.count += 1
+        self.seen += 1
+
+    def series(self) -> np.ndarray:
+        return self.rows[:self.count]
+
+
+class TrainingMetrics:
+    # streams one player's training series in fixed memory: rolling means over the last window rounds,
+    # a reservoir of evenly spaced points over the whole run, and with a path, every flush_interval rounds
+    # a csv row appended to path (tail it while the run goes) and the reservoir rewritten next to it as .npz
+    # call observe() once after every round the player plays
+    def __init__(self, player: BasePlayer, path: str = None, window: int = METRICS_WINDOW,
+                 reservoir_size: int = METRICS_RESERVOIR_SIZE, flush_interval: int = METRICS_FLUSH_INTERVAL) -> None:
+        self.player = player
+        self.path = path
+        self.flush_interval = flush_interval
+        self.wins = RollingWindow(window)
+        self.chip_deltas = RollingWindow(window)
+        self.reservoir = Reservoir(reservoir_size, len(COLUMNS))
+        self.rounds = 0
+        self.last_wins = player.score['wins']
+        self.last_chips = player.chips
+        self.flush_time = time.perf_counter()
+        self.flush_hands = player.hands_seen
+        self.hands_per_second = 0.0
+
+    def observe(self):
+        wins, chips = self.player.score['wins'], self.player.chips
+        self.wins.add(wins - self.last_wins)
+        self.chip_deltas.add(chips - self.last_chips)
+        self.last_wins, self.last_chips = wins, chips
+        self.rounds += 1
+
+        self.reservoir.step(self.row() if self.reservoir.due() else None)
+        if self.path and self.rounds % self.flush_interval == 0:
+            self.flush()
+
+    # the current value of every column; counting q states walks the table, so rows are only built when kept
+    def row(self) -> list:
+        p = self.player
+        engine_states = getattr(p.decision_engine, 'states', None)
+        return [p.hands_seen, p.chips, p.score['wins'], p.score['losses'], p.score['draws'],
+                p.score['wins'] / max(p.hands_seen, 1), self.wins.mean(), self.chip_deltas.mean(),
+                len(engine_states) if engine_states is not None else 0, self.hands_per_second]
+
+    def npz_path(self) -> str:
+        return os.path.splitext(self.path)[0] + '.npz'
+
+    def flush(self):
+        now = time.perf_counter()
+        self.hands_per_second = (self.player.hands_seen - self.flush_hands) / max(now - self.flush_time, 1e-9)
+        self.flush_time, self.flush_hands = now, self.player.hands_seen
+
+        new_file = not os.path.exists(self.path)
+        with open(self.path, 'a') as metrics_file:
+            if new_file:
+                metrics_file.write(','.join(COLUMNS) + '\n')
+            metrics_file.write(','.join(f'{value:.10g}' for value in self.row()) + '\n')
+
+        # written aside and swapped in, so a reader never sees half a file
+        partial = self.npz_path() + '.partial.npz'
+        np.savez(partial, **self.series())
+        os.replace(partial, self.npz_path())
+
+    # column name -> the reservoir's kept values
+    def series(self) -> dict:
+        rows = self.reservoir.series()
+        return {column: rows[:, i] for i, column in enumerate(COLUMNS)}
+
+
+# column name -> values of a metrics csv, for plotting a run offline or while it is still going
+def read_metrics(path: str) -> dict:
+    rows = np.loadtxt(path, delimiter=',', skiprows=1, ndmin=2)
+    return {column: rows[:, i] for i, column in enumerate(COLUMNS)}
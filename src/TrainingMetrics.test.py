@@ -0,0 +1,52 @@
+import os
+import tempfile
+
+import numpy as np
+
+from src.BlackjackTable import BlackjackTable
+from src.Player import QPlayer
+from src.Rng import BatchedRng
+from src.TrainingMetrics import Reservoir, RollingWindow, TrainingMetrics, read_metrics
+
+
+def test_rolling_window():
+    window = RollingWindow(4)
+    assert window.mean() == 0
+    for value in range(10):
+        window.add(value)
+    assert window.mean() == np.mean([6, 7, 8, 9])
+
+
+def test_reservoir_keeps_evenly_spaced_rows():
+    reservoir = Reservoir(8, 1)
+    for value in range(100):
+        reservoir.step([value] if reservoir.due() else None)
+    kept = reservoir.series()[:, 0].tolist()
+    assert len(kept) <= 8
+    assert kept[0] == 0
+    assert kept == list(range(0, 100, reservoir.stride))
+
+
+def test_streams_to_files():
+    table = BlackjackTable(0, rng=BatchedRng(1))
+    player = QPlayer('sam', 1000, rng=BatchedRng(2))
+    table.add_player(player)
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = os.path.join(data_dir, 'sam.metrics.csv')
+        metrics = TrainingMetrics(player, path, window=50, reservoir_size=16, flush_interval=100)
+        for _ in range(1000):
+            table.complete_a_round()
+            metrics.observe()
+
+        rows = read_metrics(path)
+        assert rows['hands'].tolist() == list(range(100, 1001, 100))
+        assert rows['wins'][-1] == player.score['wins']
+        assert rows['chips'][-1] == player.chips
+        assert 0 <= rows['window_win_rate'].min() and rows['window_win_rate'].max() <= 1
+        assert rows['q_states'][-1] == len(player.decision_engine.states)
+
+        # the npz holds the whole run downsampled, from the first round on
+        with np.load(os.path.join(data_dir, 'sam.metrics.npz')) as series:
+            assert len(series['hands']) <= 16
+            assert series['hands'][0] == 1
+            assert np.all(np.diff(series['hands']) > 0)
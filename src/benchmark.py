@@ -0,0 +1,230 @@
+#!/usr/lib/python3
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from src.constants import *
+from src.BlackjackTable import BlackjackTable
+from src.Deck import CODE_CARDS, Deck
+from src.Hand import Hand
+from src.Player import QDecisionEngine, QPlayer
+from src.Rng import BatchedRng
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'benchmark_baseline.json')
+# a benchmark fails once it runs this much slower than its baseline, e.g. 0.25 is 25% slower
+REGRESSION_THRESHOLD = 0.25
+SEED = 1234
+MIN_REPEAT_SECONDS = 0.05
+
+# name -> (setup, ops per run); setup builds the workload and returns a function doing one run of it
+BENCHMARKS = {}
+
+
+def benchmark(name: str, ops: int):
+    def register(setup):
+        BENCHMARKS[name] = (setup, ops)
+        return setup
+    return register
+
+
+# the same 1000 hands of two to four cards every time
+def sample_hands(num_hands: int = 1000):
+    rng = BatchedRng(SEED)
+    return [Hand([rng.choice(CODE_CARDS) for _ in range(rng.randint(2, 4))]) for _ in range(num_hands)]
+
+
+@benchmark('hand_sum', ops=1000)
+def setup_hand_sum():
+    hands = sample_hands()
+    def run():
+        for hand in hands:
+            hand.sum()
+    return run
+
+
+@benchmark('hand_is_blackjack', ops=1000)
+def setup_hand_is_blackjack():
+    hands = sample_hands()
+    def run():
+        for hand in hands:
+            hand.is_blackjack()
+    return run
+
+
+@benchmark('deck_shuffle', ops=1)
+def setup_deck_shuffle():
+    deck = Deck(NUM_DECKS, rng=BatchedRng(SEED))
+    return deck.shuffle
+
+
+@benchmark('deck_next', ops=1000)
+def setup_deck_next():
+    deck = Deck(NUM_DECKS, rng=BatchedRng(SEED))
+    deck.shuffle()
+    def run():
+        for _ in range(1000):
+            deck.next()
+    return run
+
+
+@benchmark('q_stage_action', ops=1000)
+def setup_q_stage_action():
+    engine = QDecisionEngine(BatchedRng(SEED))
+    rng = BatchedRng(SEED + 1)
+    decisions = [(rng.choice(CODE_CARDS), hand) for hand in sample_hands() if not hand.is_bust()][:1000]
+    decisions = (decisions * 2)[:1000]
+    def run():
+        for dealer_card, hand in decisions:
+            engine.stage_action(dealer_card, hand)
+    return run
+
+
+@benchmark('table_complete_a_round', ops=100)
+def setup_table_complete_a_round():
+    table = BlackjackTable(3, rng=BatchedRng(SEED))
+    def run():
+        for _ in range(100):
+            table.complete_a_round()
+    return run
+
+
+# a player that has seen every state, the largest table a dense QTable can hold
+def large_player(file_format: str, file_prefix: str) -> QPlayer:
+    player = QPlayer('bench', 1000, file_format=file_format, file_prefix=file_prefix, rng=BatchedRng(SEED))
+    states = player.decision_engine.states
+    states.values[:] = np.random.default_rng(SEED).uniform(0, 50, states.values.shape).round(2)
+    states.visits[:] = 1
+    states.invalidate()
+    return player
+
+
+def setup_player_save(file_format: str):
+    directory = tempfile.TemporaryDirectory()
+    player = large_player(file_format, directory.name)
+    def run():
+        # keeps the directory alive for as long as the benchmark runs
+        assert os.path.isdir(directory.name)
+        player.save_to_file()
+    return run
+
+
+def setup_player_load(file_format: str):
+    directory = tempfile.TemporaryDirectory()
+    large_player(file_format, directory.name).save_to_file()
+    def run():
+        assert os.path.isdir(directory.name)
+        QPlayer('bench', 1000, file_format=file_format, file_prefix=directory.name).load_from_file()
+    return run
+
+
+for file_format in ('json', 'npz'):
+    benchmark(f'player_save_{file_format}', ops=1)(lambda f=file_format: setup_player_save(f))
+    benchmark(f'player_load_{file_format}', ops=1)(lambda f=file_format: setup_player_load(f))
+
+
+# best of repeats, in nanoseconds per op; the best repeat is the one least disturbed by the rest of the machine
+# each repeat calls run enough times to last at least min_seconds, short runs are mostly timer noise
+def run_benchmarks(names=None, repeats: int = 5, min_seconds: float = MIN_REPEAT_SECONDS) -> dict:
+    results = {}
+    for name, (setup, ops) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        run = setup()
+        # the warm up run also sizes the repeats
+        start = time.perf_counter()
+        run()
+        loops = max(1, int(min_seconds / max(time.perf_counter() - start, 1e-9)))
+
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for _ in range(loops):
+                run()
+            timings.append((time.perf_counter() - start) / loops)
+        results[name] = {
+            'ns_per_op': min(timings) / ops * 1e9,
+            'ops': ops,
+            'loops': loops,
+            'repeats': repeats
+        }
+    return results
+
+
+# names of the benchmarks that got slower than baseline by more than threshold, with their slowdown ratio
+def find_regressions(results: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD) -> dict:
+    regressions = {}
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['ns_per_op'] / baseline[name]['ns_per_op']
+        if ratio > 1 + threshold:
+            regressions[name] = ratio
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='benchmark the simulator hot paths against a stored baseline')
+    parser.add_argument('names', nargs='*', help='benchmarks to run, all of them by default')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', help='write the results to this json file')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='this machine\'s baseline, not checked in')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument('--update-baseline', action='store_true', help='store these results as the new baseline')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    # the table logs every hand, keep that out of the timings
+    logging.disable(logging.INFO)
+
+    results = run_benchmarks(args.names, args.repeats)
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=3, sort_keys=True)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r') as baseline_file:
+                baseline = json.load(baseline_file)['results']
+        report['results'] = {**baseline, **results}
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(report, baseline_file, indent=3, sort_keys=True)
+        print(f'baseline written to {args.baseline}')
+        baseline = report['results']
+    elif not os.path.exists(args.baseline):
+        # timings only compare on the machine that recorded them, so each machine records its own
+        print(f'no baseline at {args.baseline}, record one on this machine with --update-baseline')
+        return 2
+    else:
+        with open(args.baseline, 'r') as baseline_file:
+            baseline = json.load(baseline_file)['results']
+
+    regressions = find_regressions(results, baseline, args.threshold)
+    for name, result in results.items():
+        ratio = result['ns_per_op'] / baseline[name]['ns_per_op'] if name in baseline else float('nan')
+        flag = ' REGRESSION' if name in regressions else ''
+        print(f"{name:<24} {result['ns_per_op']:>14.0f} ns/op  {ratio:5.2f}x baseline{flag}")
+
+    if regressions:
+        print(f'{len(regressions)} benchmark(s) slower than baseline by more than {args.threshold:.0%}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
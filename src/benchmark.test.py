@@ -0,0 +1,28 @@
+import os
+import tempfile
+
+from src.benchmark import BENCHMARKS, find_regressions, main, run_benchmarks
+
+def test_find_regressions():
+    baseline = {'fast': {'ns_per_op': 100.0}, 'slow': {'ns_per_op': 100.0}}
+    results = {'fast': {'ns_per_op': 110.0}, 'slow': {'ns_per_op': 140.0}, 'new': {'ns_per_op': 1e9}}
+    # only known benchmarks past the threshold count, new ones have nothing to compare with
+    assert list(find_regressions(results, baseline, threshold=0.25)) == ['slow']
+    assert find_regressions(results, baseline, threshold=0.5) == {}
+
+def test_run_benchmarks():
+    results = run_benchmarks(['hand_sum', 'q_stage_action'], repeats=1, min_seconds=0)
+    assert set(results) == {'hand_sum', 'q_stage_action'}
+    assert all(result['ns_per_op'] > 0 for result in results.values())
+    assert {'deck_shuffle', 'table_complete_a_round', 'player_save_npz', 'player_load_json'} <= set(BENCHMARKS)
+
+def test_baseline_is_only_written_on_request():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'baseline.json')
+        # a missing baseline fails instead of quietly becoming one
+        assert main(['hand_sum', '--repeats', '1', '--baseline', path]) == 2
+        assert not os.path.exists(path)
+
+        assert main(['hand_sum', '--repeats', '1', '--baseline', path, '--update-baseline']) == 0
+        assert os.path.exists(path)
+        assert main(['hand_sum', '--repeats', '1', '--baseline', path, '--threshold', '100']) == 0
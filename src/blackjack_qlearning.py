@@ -1,6 +1,18 @@
 #!/usr/lib/python3
 
+import argparse
 import logging
+import os
+import threading
+import time
+
+from src.constants import *
+from src.BlackjackTable import BlackjackTable
+from src.Deck import Deck
+from src.ParallelTrainer import ParallelTrainer
+from src.Player import QPlayer
+from src.Rng import BatchedRng
+from src.TrainingMetrics import TrainingMetrics
 
 
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
@@ -8,20 +20,155 @@ logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 
 # set of all possible states, with all possible choices at each one and values for each
 
+class Checkpointer:
+    # saves player snapshots on a background thread so play never waits on the disk
+    # only one save is in flight at a time, a new one first waits for the previous to finish
+    # a failed background save is raised from the next wait(), so it can't go unnoticed
+    def __init__(self) -> None:
+        self.thread = None
+        self.error = None
+        self.snapshot_seconds = 0.0
+        self.save_seconds = 0.0
+
+    def save(self, player: QPlayer):
+        self.wait()
+        # journaled and store-backed players save incrementally, no need for a snapshot
+        if player.saves_incrementally():
+            start = time.perf_counter()
+            player.save_to_file()
+            self.save_seconds += time.perf_counter() - start
+            return
+
+        start = time.perf_counter()
+        snapshot = player.snapshot()
+        self.snapshot_seconds += time.perf_counter() - start
+        player.saves += 1
+
+        self.thread = threading.Thread(target=self._write, args=(snapshot,))
+        self.thread.start()
+
+    def _write(self, snapshot: QPlayer):
+        start = time.perf_counter()
+        try:
+            snapshot.save_to_file()
+        except Exception as e:
+            self.error = e
+            return
+        self.save_seconds += time.perf_counter() - start
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='train a q-learning blackjack player')
+    parser.add_argument('--name', default='danny', help='player name, also the player file name')
+    parser.add_argument('--hands', type=int, default=NUM_TRAINING_ITERATIONS,
+                        help='total hands the player should have seen, counting hands from a resumed file')
+    parser.add_argument('--players', type=int, default=1, help='players at the table, including the trained one')
+    parser.add_argument('--decks', type=int, default=NUM_DECKS)
+    parser.add_argument('--checkpoint-interval', type=int, default=10000, help='hands between checkpoints')
+    parser.add_argument('--workers', type=int, default=1, help='self-play processes, 1 trains in this process')
+    parser.add_argument('--data-dir', default=PLAYER_FILE_PREFIX)
+    parser.add_argument('--file-format', default=PLAYER_FILE_FORMAT, choices=['json', 'npz', 'journal', 'store'])
+    parser.add_argument('--learning', default=Q_LEARNING, choices=['weights', 'td', 'mc'],
+                        help='weights bumps sampling weights by fixed rewards, td/mc back up each round\'s net chips')
+    parser.add_argument('--seed', type=int, default=None, help='seed for reproducible runs')
+    parser.add_argument('--stats', action='store_true', help='report time per round phase and table counters, single process only')
+    parser.add_argument('--metrics', default=None,
+                        help='csv file to stream training metrics to (plus a .npz of the whole run), single process only')
+    parser.add_argument('--metrics-interval', type=int, default=METRICS_FLUSH_INTERVAL, help='rounds between metrics flushes')
+    parser.add_argument('--log-level', default='WARNING')
+    return parser.parse_args(argv)
+
+
+def report(player: QPlayer, hands: int, play_seconds: float, checkpointer: Checkpointer, stats: dict = None):
+    metadata = player.get_metadata()
+    wins = metadata['score']['wins']
+    print(
+        f"hands {metadata['hands_seen']}"
+        f" | {hands / max(play_seconds, 1e-9):.0f} hands/s"
+        f" | win rate {wins / max(metadata['hands_seen'], 1):.3f}"
+        f" | states {metadata['engine']['num_states']}"
+        f" | play {play_seconds:.2f}s"
+        f" snapshot {checkpointer.snapshot_seconds:.3f}s"
+        f" save {checkpointer.save_seconds:.3f}s",
+        flush=True
+    )
+    if stats:
+        # totals since training started
+        phases = ' '.join(f'{phase} {seconds:.2f}s' for phase, seconds in stats['seconds'].items())
+        counters = ' '.join(f'{name} {count}' for name, count in stats['counters'].items())
+        print(f'  phases: {phases} | {counters}', flush=True)
+
+
+def train(args) -> QPlayer:
+    os.makedirs(args.data_dir, exist_ok=True)
+    rng = BatchedRng(args.seed)
+    player = QPlayer(args.name, 1000, file_format=args.file_format, file_prefix=args.data_dir, rng=rng.spawn(1)[0],
+                     learning=args.learning)
+    player.load_from_file()
+    if player.hands_seen >= args.hands:
+        print(f'{player.get_name()} has already seen {player.hands_seen} hands')
+        return player
+
+    # resume from where the player file left off
+    print(f'training {player.get_name()} from hand {player.hands_seen} to {args.hands}', flush=True)
+    checkpointer = Checkpointer()
+    trainer = None
+    table = None
+    metrics = None
+    if args.workers > 1:
+        # workers exchange dense q tables
+        assert args.file_format != 'store', 'the store format trains in a single process'
+        trainer = ParallelTrainer(player, args.workers, sync_interval=max(1, args.checkpoint_interval // args.workers),
+                                  seed=args.seed, num_players=args.players, num_decks=args.decks)
+    else:
+        table = BlackjackTable(args.players - 1, deck=Deck(args.decks, rng=rng.spawn(1)[0]), rng=rng)
+        table.add_player(player)
+        if args.stats:
+            table.enable_stats()
+        if args.metrics:
+            metrics = TrainingMetrics(player, args.metrics, flush_interval=args.metrics_interval)
+
+    try:
+        while player.hands_seen < args.hands:
+            hands = min(args.checkpoint_interval - player.hands_seen % args.checkpoint_interval,
+                        args.hands - player.hands_seen)
+            start = time.perf_counter()
+            if trainer:
+                trainer.train(hands)
+            elif metrics:
+                for _ in range(hands):
+                    table.complete_a_round()
+                    metrics.observe()
+            else:
+                for _ in range(hands):
+                    table.complete_a_round()
+            play_seconds = time.perf_counter() - start
+
+            checkpointer.save(player)
+            report(player, hands, play_seconds, checkpointer, table.get_stats() if table else None)
+    finally:
+        try:
+            # the last checkpoint is still writing, and it or an earlier one may have failed
+            checkpointer.wait()
+        finally:
+            if player.journal:
+                player.journal.close()
+            if player.file_format == 'store':
+                player.decision_engine.states.close()
+            if trainer:
+                trainer.close()
+    return player
+
+
 if __name__ == '__main__':
-    pass
-    # test_getSum()
-    # test_shuffleDeck()
-    # test_prepDeck()
-    # test_sortHand()
-    # test_tableSetup()
-    # test_isBlackjack()
-    # test_player_q_action()
-    # test_view_player_q_action_states()
-    # test_table_population()
-
-
-    # test_table_round()
-    # test_iterate_table_and_graph() # main driver
-
-    # test_generate_all_q_states()
\ No newline at end of file
+    args = parse_args()
+    logging.getLogger().setLevel(args.log_level)
+    train(args)
@@ -0,0 +1,34 @@
+import logging
+import os
+import tempfile
+
+import pytest
+
+from src.blackjack_qlearning import Checkpointer, parse_args, train
+from src.Player import QPlayer
+
+def test_train_and_resume():
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as tmp:
+        player = train(parse_args(['--hands', '300', '--checkpoint-interval', '100', '--data-dir', tmp]))
+        assert player.hands_seen == 300
+
+        # picks up from the saved hands_seen and only plays the rest
+        resumed = train(parse_args(['--hands', '450', '--checkpoint-interval', '100', '--data-dir', tmp]))
+        assert resumed.hands_seen == 450
+        assert sum(resumed.score.values()) == 450
+
+        # a data dir that doesn't exist yet is created
+        nested = train(parse_args(['--hands', '100', '--checkpoint-interval', '100', '--data-dir', f'{tmp}/a/b']))
+        assert nested.hands_seen == 100
+        assert os.path.exists(f'{tmp}/a/b/danny.json')
+
+
+def test_failed_background_save_is_raised():
+    checkpointer = Checkpointer()
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpointer.save(QPlayer('danny', 1000, file_prefix=f'{tmp}/missing'))
+        with pytest.raises(FileNotFoundError):
+            checkpointer.wait()
+    # raised once, then the checkpointer is usable again
+    checkpointer.wait()
@@ -1,4 +1,14 @@
+import os
+
 NUM_DECKS = 6
+# uniforms pre-generated per refill of a BatchedRng
+RNG_BATCH_SIZE = 4096
+# fraction of the shoe dealt before the cut card comes out and the shoe is reshuffled
+DECK_PENETRATION = 0.75
+# card counting system the table's ShoeTracker keeps the running count in, see ShoeTracker.COUNT_SYSTEMS
+COUNT_SYSTEM = 'hi-lo'
+# largest bet a player ramps up to as the true count rises, 1 keeps every bet flat
+BET_SPREAD = 1
 SUITS = ['spades', 'hearts', 'clubs', 'diamonds']
 SUIT_EMOJIS = {
     'spades': '♠️',
@@ -19,7 +29,43 @@ DEFAULT_VECTOR = [1, 1, 1, 1]
 GOOD_REWARD_VALUE=9
 BAD_REWARD_VALUE=3
 
+# NNDecisionEngine network and training
+NN_HIDDEN_SIZES=[32, 32]
+NN_LEARNING_RATE=1e-3
+# finished decisions collected before each training step
+NN_TRAIN_BATCH_SIZE=256
+# chance of a random legal action instead of the best one while training
+NN_EPSILON=0.1
+NN_INCLUDE_TRUE_COUNT=False
+
+# how a QPlayer learns from finished rounds:
+# 'weights' keeps each q row as sampling weights moved by GOOD_REWARD_VALUE/BAD_REWARD_VALUE,
+# 'td' (one step q-learning) and 'mc' (monte carlo returns) keep each row as the expected net chips of each action
+Q_LEARNING='weights'
+# step size of the td/mc backups
+Q_LEARNING_RATE=0.05
+Q_DISCOUNT=1.0
+# td/mc exploration, a random legal action with probability max(min, start * decay ** rounds learned from)
+Q_EPSILON_START=0.5
+Q_EPSILON_DECAY=0.9995
+Q_EPSILON_MIN=0.02
+
+# ReplayBuffer: transitions kept, and the prioritized sampling exponents,
+# alpha sharpens sampling toward large errors, beta sets how much the importance weights undo that
+REPLAY_CAPACITY=100000
+REPLAY_PRIORITY_ALPHA=0.6
+REPLAY_PRIORITY_BETA=0.4
+# keeps every priority above 0, so a transition with no error left is still sampled now and then
+REPLAY_PRIORITY_EPSILON=1e-3
+
+# TrainingMetrics: rounds the rolling means cover, points kept over the whole run, rounds between file flushes
+METRICS_WINDOW=1000
+METRICS_RESERVOIR_SIZE=1024
+METRICS_FLUSH_INTERVAL=10000
+
 INCLUDE_DEALER_IN_Q_STATE=True
+# 'composition' keys q states on the exact card values held, 'total' on hard/soft total and pairs
+Q_STATE_ENCODING='composition'
 INCLUDE_SUIT_IN_CARD_VALUE=False
 NUM_TRAINING_ITERATIONS=1000
 
@@ -31,7 +77,28 @@ TableRoundStates = {
     'ACTIVE_DEAL': 'active_deal'
 }
 
-PLAYER_FILE_PREFIX='../player_data'
+# the repo's player_data directory, wherever the code is run from
+PLAYER_FILE_PREFIX=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'player_data')
+# 'json' (readable, keyed by state description), 'npz' (dense q table arrays),
+# 'journal' (append-only update log) or 'store' (indexed sqlite file behind an LRU cache)
+PLAYER_FILE_FORMAT='json'
+# the update journal is folded into a snapshot on the save after it grows past this
+JOURNAL_COMPACTION_BYTES=8 * 1024 * 1024
+# q store rows kept in memory before changed ones are written back to disk
+Q_STORE_CACHE_SIZE=4096
+# dealer outcome distributions kept by DealerOutcomes, one per (upcard, shoe composition)
+DEALER_OUTCOME_CACHE_SIZE=4096
+
+# TableHost: local port it listens on, seats at each table, seconds a table waits for its remote seats'
+# decisions in a round before they stand, rounds a seat can time out in a row before it is removed,
+# and messages queued to a client before it is dropped as too slow to keep up
+HOST_PORT=8642
+HOST_SEATS_PER_TABLE=7
+HOST_ROUND_TIMEOUT=5.0
+HOST_MAX_MISSED_ROUNDS=3
+HOST_SEND_QUEUE_SIZE=256
+HOST_MAX_LINE_BYTES=4096
+HOST_STARTING_CHIPS=1000
 
 PLAYER_POSSIBLE_ACTIONS = {
     'STAY': 'STAY',